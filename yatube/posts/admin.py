@@ -1,38 +1,56 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
+from . import search
+from .paginators import EstimatedCountPaginator
 from .models import Post, Group, Comment, Follow
 
 
-class PostAdmin(admin.ModelAdmin):
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """Списки без полного COUNT(*) на больших таблицах."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Post)
+class PostAdmin(EstimatedCountAdmin):
     list_display = ('pk',
                     'text',
                     'pub_date',
                     'author',
                     'group')
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
-
-admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по индексу FTS5 вместо LIKE по всем текстам."""
+        if not search.match_expression(search_term):
+            return queryset, False
+        return queryset.filter(
+            pk__in=RawSQL(*search.matching_ids(search_term))), False
 
 
+@admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'description', 'slug')
-    search_fields = ('title')
+    search_fields = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+@admin.register(Comment)
+class CommentAdmin(EstimatedCountAdmin):
     list_display = ('post', 'author', 'text', 'created')
-    search_fields = ('author', 'post')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    search_fields = ('^author__username',)
     list_filter = ('created',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+@admin.register(Follow)
+class FollowAdmin(EstimatedCountAdmin):
     list_display = ('user', 'author')
-    search_fields = ('author', 'user')
-    list_filter = ('author',)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('^author__username', '^user__username')
@@ -0,0 +1,215 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from . import images
+
+CARD_TEMPLATE = 'includes/post_structure.html'
+# Начало отсчёта времени в UUID1 (15.10.1582) в сотнях наносекунд
+# до эпохи Unix.
+UUID_EPOCH = 0x01b21dd213814000
+
+
+def version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def new_version():
+    """Метка версии; UUID1 хранит и время, когда версия сменилась."""
+    return uuid.uuid1().hex
+
+
+def version_time(version):
+    token = uuid.UUID(version)
+    if token.version != 1:
+        return None
+    return datetime.fromtimestamp(
+        (token.time - UUID_EPOCH) / 10 ** 7, timezone.utc)
+
+
+def bump_version(kind, pk):
+    """Делает устаревшими карточки и страницы, которые зависят от объекта."""
+    cache.set(version_key(kind, pk), new_version(),
+              settings.CACHE_VERSION_TIMEOUT)
+
+
+def bump_versions(kind, pks):
+    token = new_version()
+    cache.set_many({version_key(kind, pk): token for pk in pks},
+                   settings.CACHE_VERSION_TIMEOUT)
+
+
+def feed_count_key(feed):
+    return f'feed_count:{feed}'
+
+
+def change_feed_counts(feeds, delta):
+    """Сдвигает закэшированные счётчики лент, если они уже посчитаны."""
+    for feed in feeds:
+        try:
+            cache.incr(feed_count_key(feed), delta)
+        except ValueError:
+            pass
+
+
+def forget_feed_counts(feeds):
+    """Сбрасывает счётчики лент, чтобы пагинатор посчитал их заново."""
+    cache.delete_many([feed_count_key(feed) for feed in feeds])
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, settings.CACHE_VERSION_TIMEOUT)
+        versions.update(missing)
+    return versions
+
+
+def card_dependencies(post):
+    return (
+        version_key('post', post.pk),
+        version_key('user', post.author_id),
+        version_key('group', post.group_id),
+    )
+
+
+def render_post_cards(posts):
+    """Отдаёт HTML карточек постов, отрисовывая только устаревшие.
+
+    Ключ карточки складывается из версий поста, автора и группы,
+    поэтому для страницы хватает двух обращений к кэшу. Миниатюры
+    устаревших карточек читаются из хранилища sorl тоже одной пачкой.
+    """
+    posts = list(posts)
+    versions = get_versions(
+        {key for post in posts for key in card_dependencies(post)})
+    keys = [
+        'post_card:{}:{}'.format(post.pk, ':'.join(
+            versions[key] for key in card_dependencies(post)))
+        for post in posts
+    ]
+    # Метки версий живут в default, карточки - в отдельном кэше.
+    fragments = caches['fragments']
+    cards = fragments.get_many(keys)
+    stale = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards]
+    images.prefetch_thumbnails(post for key, post in stale)
+    rendered = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post})
+        for key, post in stale}
+    if rendered:
+        fragments.set_many(rendered, settings.POST_CARD_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def cached_response(key, request, view, *args, **kwargs):
+    """Ответ view из кэша pages или только что отрисованный.
+
+    В отличие от cache_page не выставляет Cache-Control: max-age:
+    с ним браузеры и прокси показывали бы страницу и после изменений,
+    хотя здесь её кэш сбрасывается сразу.
+    """
+    pages = caches['pages']
+    response = pages.get(key)
+    if response is None:
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            pages.set(key, response, settings.FEED_CACHE_TIMEOUT)
+    return response
+
+
+def cache_feed(feed):
+    """Кэширует страницы ленты до следующего изменения в ней.
+
+    Поколение ленты входит в ключ, поэтому после bump_version все
+    закэшированные страницы сразу перестают находиться. В шапке
+    страницы - имя пользователя, поэтому у каждого свой кэш.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            version = version_key('feed', feed)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = (f'{feed}_page:{get_versions([version])[version]}:'
+                   f'{request.user.pk}:{path}')
+            return cached_response(key, request, view, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def validators(keys, parts=()):
+    """Хэш для ETag и время изменения, посчитанные без отрисовки.
+
+    keys - версии объектов, от которых зависит ответ. Версия меняется
+    при создании, правке и удалении объекта и помнит время смены,
+    поэтому самая свежая из них и есть время изменения ответа.
+    """
+    versions = get_versions(keys)
+    raw = repr((sorted(versions.items()), tuple(parts)))
+    times = [version_time(version) for version in versions.values()]
+    return (hashlib.md5(raw.encode()).hexdigest(),
+            max(filter(None, times), default=None))
+
+
+def page_validators(request, keys, parts=()):
+    """validators страницы, которая выглядит по-разному для каждого."""
+    user = request.user.get_username() if request.user.is_authenticated else ''
+    return validators(keys, (request.get_full_path(), user, *parts))
+
+
+def conditional(get_validators, cached=False, private=False):
+    """Отвечает 304, если ответ не менялся с прошлого запроса клиента.
+
+    get_validators(request, *args, **kwargs) возвращает результат
+    validators или None, если проверять нечего. ETag слабый: токен CSRF
+    в формах меняется при каждой отрисовке. С cached=True ответ ещё
+    и кэшируется под ключом из того же хэша, так что после изменения
+    старый ответ больше не находится. Cache-Control: no-cache велит
+    клиентам и прокси спрашивать сервер при каждом показе; private -
+    для ответов, которые нельзя хранить в общих кэшах.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            result = None
+            if request.method in ('GET', 'HEAD'):
+                result = get_validators(request, *args, **kwargs)
+            if result is None:
+                return view(request, *args, **kwargs)
+            digest, last_modified = result
+
+            def response_view(request, *args, **kwargs):
+                if not cached:
+                    return view(request, *args, **kwargs)
+                return cached_response(
+                    f'conditional:{digest}', request, view, *args, **kwargs)
+
+            response = condition(
+                etag_func=lambda *args, **kwargs: f'W/"{digest}"',
+                last_modified_func=lambda *args, **kwargs: last_modified,
+            )(response_view)(request, *args, **kwargs)
+            if last_modified is not None and response.status_code == 200:
+                # Свой Last-Modified (например, у Feed) старее версий,
+                # и If-Modified-Since с ним никогда не дал бы 304.
+                response['Last-Modified'] = http_date(
+                    last_modified.timestamp())
+            if private:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+@register()
+def check_task_cache(app_configs, **kwargs):
+    """Воркеру нужен общий с сайтом кэш, иначе страницы его не увидят."""
+    if settings.TASKS_EAGER or not isinstance(caches['default'], LocMemCache):
+        return []
+    return [Warning(
+        'Задачи выполняет runworker, а кэш default свой у каждого процесса.',
+        hint=('Миниатюры, созданные воркером, не появятся на страницах. '
+              'Задайте YATUBE_CACHE_BACKEND=file или db, '
+              'или YATUBE_TASKS_EAGER=1.'),
+        id='posts.W001',
+    )]
@@ -0,0 +1,98 @@
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, StoredFile, UserStats
+from .storage import is_content_name
+
+# Счётчик пользователя: модель и поле, по которому считаются её строки.
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def get_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def count_for_users(user_ids):
+    """Считает счётчики пачки пользователей по исходным таблицам."""
+    counts = {
+        user_id: dict.fromkeys(USER_COUNTERS, 0) for user_id in user_ids}
+    for field, (model, lookup) in USER_COUNTERS.items():
+        rows = model.objects.filter(
+            **{f'{lookup}__in': user_ids}
+        ).order_by().values_list(lookup).annotate(total=Count('pk'))
+        for user_id, total in rows:
+            counts[user_id][field] = total
+    return counts
+
+
+def change_user_counter(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    updated = stats.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        UserStats.objects.get_or_create(
+            user_id=user_id, defaults=count_for_users([user_id])[user_id])
+
+
+def change_comments_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def change_file_references(name, delta):
+    """Сдвигает число ссылок на файл из хранилища по содержимому."""
+    if not is_content_name(name):
+        return
+    files = StoredFile.objects.filter(name=name)
+    if delta < 0:
+        files = files.filter(references__gte=-delta)
+    updated = files.update(
+        references=F('references') + delta, changed=timezone.now())
+    if not updated and delta > 0:
+        StoredFile.objects.get_or_create(
+            name=name, defaults={'references': delta})
+
+
+def recount_users(user_ids):
+    """Исправляет счётчики пачки пользователей, возвращает число правок."""
+    counts = count_for_users(user_ids)
+    existing = UserStats.objects.in_bulk(user_ids)
+    changed, created = [], []
+    for user_id, values in counts.items():
+        stats = existing.get(user_id)
+        if stats is None:
+            created.append(UserStats(user_id=user_id, **values))
+            continue
+        if any(getattr(stats, field) != value
+               for field, value in values.items()):
+            for field, value in values.items():
+                setattr(stats, field, value)
+            changed.append(stats)
+    UserStats.objects.bulk_create(created)
+    UserStats.objects.bulk_update(changed, list(USER_COUNTERS))
+    return len(changed) + len(created)
+
+
+def recount_posts(post_ids):
+    """Исправляет число комментариев пачки постов."""
+    counts = dict(Comment.objects.filter(
+        post_id__in=post_ids
+    ).order_by().values_list('post').annotate(total=Count('pk')))
+    changed = []
+    for post in Post.objects.filter(pk__in=post_ids).only('comments_count'):
+        total = counts.get(post.pk, 0)
+        if post.comments_count != total:
+            post.comments_count = total
+            changed.append(post)
+    Post.objects.bulk_update(changed, ['comments_count'])
+    return len(changed)
@@ -0,0 +1,95 @@
+"""Выгрузка постов и комментариев в NDJSON.
+
+Строки читаются пачками по первичному ключу (pk > последнего
+выданного) через iterator(), поэтому память не растёт вместе
+с таблицей. Формат строк совпадает с тем, что принимает
+import_content.
+"""
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Comment, Post
+
+BATCH_SIZE = 1000
+CONTENT_TYPE = 'application/x-ndjson'
+
+
+def parse_bound(value, end=False):
+    """Граница диапазона дат: дата целиком или точное время."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Некорректная дата: {value!r}')
+        moment = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def posts(author=None, group=None, since=None, until=None):
+    queryset = Post.objects.values(
+        'id', 'text', 'pub_date', 'image',
+        author_name=F('author__username'), group_slug=F('group__slug'))
+    if author:
+        queryset = queryset.filter(author__username=author)
+    if group:
+        queryset = queryset.filter(group__slug=group)
+    if since:
+        queryset = queryset.filter(pub_date__gte=parse_bound(since))
+    if until:
+        queryset = queryset.filter(pub_date__lte=parse_bound(until, True))
+    return queryset
+
+
+def comments(author=None, group=None, since=None, until=None):
+    queryset = Comment.objects.values(
+        'id', 'post', 'text', 'created', author_name=F('author__username'))
+    if author:
+        queryset = queryset.filter(author__username=author)
+    if group:
+        queryset = queryset.filter(post__group__slug=group)
+    if since:
+        queryset = queryset.filter(created__gte=parse_bound(since))
+    if until:
+        queryset = queryset.filter(created__lte=parse_bound(until, True))
+    return queryset
+
+
+KINDS = {'posts': posts, 'comments': comments}
+
+
+def rows(queryset, batch_size=BATCH_SIZE):
+    """Строки выборки пачками по возрастанию id, без OFFSET."""
+    last_pk = 0
+    while True:
+        batch = queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+        count = 0
+        for row in batch.iterator(chunk_size=batch_size):
+            count += 1
+            last_pk = row['id']
+            yield row
+        if count < batch_size:
+            return
+
+
+def to_line(row):
+    """Строка NDJSON в формате import_content."""
+    row = dict(row)
+    row['author'] = row.pop('author_name')
+    if 'group_slug' in row:
+        row['group'] = row.pop('group_slug')
+    if 'image' in row:
+        row['image'] = row['image'] or None
+    return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def ndjson(kind, batch_size=BATCH_SIZE, **filters):
+    """Генератор строк NDJSON; фильтры проверяются сразу при вызове."""
+    queryset = KINDS[kind](**filters)
+    return (to_line(row) for row in rows(queryset, batch_size))
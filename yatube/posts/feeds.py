@@ -0,0 +1,162 @@
+"""RSS и Atom ленты групп, авторов и подписок.
+
+Ленты читают программы, которые опрашивают их по расписанию, поэтому
+ответ кэшируется до следующего изменения постов, а неизменившаяся
+лента отдаётся как 304 после одного обращения к кэшу версий.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from .cache import conditional, validators, version_key
+from .models import Group, TimelineEntry
+
+User = get_user_model()
+
+FEED_ITEMS = 20
+TOKEN_SALT = 'posts.feeds.follow_feed_token'
+# Больший id не помещается в целое базы и роняет запрос вместо 404.
+MAX_USER_ID = 2 ** 63 - 1
+
+
+def follow_feed_token(user):
+    """Токен ленты подписок; меняется вместе с паролем пользователя."""
+    digest = salted_hmac(TOKEN_SALT, f'{user.pk}{user.password}').hexdigest()
+    return f'{user.pk}-{digest[::2]}'
+
+
+def token_user_id(token):
+    user_id, _, digest = token.partition('-')
+    if not (user_id.isdigit() and digest) or int(user_id) > MAX_USER_ID:
+        return None
+    return int(user_id)
+
+
+def token_user(token):
+    user = User.objects.filter(pk=token_user_id(token)).first()
+    if user is None or not constant_time_compare(
+            token, follow_feed_token(user)):
+        raise Http404('Неизвестная лента подписок')
+    return user
+
+
+class PostFeed(Feed):
+    """Общее у лент: элементы - посты, ссылки - страницы постов."""
+
+    def item_title(self, post):
+        return Truncator(post.text).chars(80)
+
+    def item_description(self, post):
+        return linebreaks(post.text, autoescape=True)
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=[post.pk])
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+
+class GroupFeed(PostFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def link(self, group):
+        return reverse('posts:group_posts', args=[group.slug])
+
+    def description(self, group):
+        return group.description
+
+    def items(self, group):
+        return group.posts.select_related('author')[:FEED_ITEMS]
+
+
+class AuthorFeed(PostFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+    def description(self, author):
+        return f'Посты автора {author.get_full_name() or author.username}'
+
+    def items(self, author):
+        return author.posts.select_related('author')[:FEED_ITEMS]
+
+
+class FollowFeed(PostFeed):
+    title = 'Yatube: подписки'
+    description = 'Посты авторов, на которых вы подписаны'
+
+    def get_object(self, request, token):
+        return token_user(token)
+
+    def link(self):
+        return reverse('posts:follow_index')
+
+    def items(self, user):
+        entries = TimelineEntry.objects.filter(
+            user=user).select_related('post__author')[:FEED_ITEMS]
+        return [entry.post for entry in entries]
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+    subtitle = GroupFeed.description
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+    subtitle = AuthorFeed.description
+
+
+class FollowAtomFeed(FollowFeed):
+    feed_type = Atom1Feed
+    subtitle = FollowFeed.description
+
+
+def feed_validators(request, *args, **kwargs):
+    """Лента группы или автора меняется вместе с лентой index."""
+    return validators(
+        [version_key('feed', 'index')], [request.get_full_path()])
+
+
+def follow_feed_validators(request, token):
+    """Ленту подписок меняет ещё раскладка постов по лентам.
+
+    Токен здесь не проверяется: без верного токена ответ 304 ничего
+    не раскрывает, а тело ленты отдаёт только FollowFeed.
+    """
+    return validators(
+        [version_key('feed', 'index'),
+         version_key('timeline', token_user_id(token))],
+        [request.get_full_path()])
+
+
+def cached(feed, get_validators=feed_validators, private=False):
+    return conditional(get_validators, cached=True, private=private)(feed)
+
+
+group_feed = cached(GroupFeed())
+group_atom_feed = cached(GroupAtomFeed())
+author_feed = cached(AuthorFeed())
+author_atom_feed = cached(AuthorAtomFeed())
+# Токен в адресе - это доступ к ленте, общим кэшам её хранить нельзя.
+follow_feed = cached(FollowFeed(), follow_feed_validators, private=True)
+follow_atom_feed = cached(
+    FollowAtomFeed(), follow_feed_validators, private=True)
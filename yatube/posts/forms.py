@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from .images import process_upload
 from .models import Post, Group, Comment
 
 
@@ -18,6 +21,23 @@ class PostForm(forms.ModelForm):
             'image': 'Изображение',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return process_upload(image)
+        except Image.DecompressionBombError:
+            raise forms.ValidationError(
+                'Изображение слишком большое, загрузите картинку '
+                'поменьше.')
+        except (OSError, ValueError):
+            # Заголовок цел, а данные обрываются: ошибка видна только
+            # при декодировании.
+            raise forms.ValidationError(
+                self.fields['image'].error_messages['invalid_image'],
+                code='invalid_image')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
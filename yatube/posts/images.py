@@ -0,0 +1,346 @@
+import base64
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.exceptions import SuspiciousOperation
+from django.core.files import File
+from PIL import Image, ImageOps
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import cache
+from .models import Post
+from .queue import task
+
+CARD_SIZE = (960, 339)
+CARD_WIDTHS = (480, 720, 960)
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+# Форматы с лучшим сжатием, которые умеет сохранять установленный Pillow,
+# от лучшего к худшему. Браузер выберет первый, который поддерживает.
+Image.init()
+CARD_FORMATS = [
+    format_ for format_ in ('AVIF', 'WEBP') if format_ in Image.SAVE]
+# sorl не знает расширения AVIF, а без него не сможет назвать файл.
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+
+def card_variant(width, format_=None):
+    """Имя варианта карточки; без формата - в формате по умолчанию."""
+    if format_ is None:
+        return 'card' if width == CARD_SIZE[0] else f'card-{width}'
+    return f'card-{width}-{format_.lower()}'
+
+
+def card_variants():
+    variants = {}
+    for format_ in (*CARD_FORMATS, None):
+        for width in CARD_WIDTHS:
+            height = round(width * CARD_SIZE[1] / CARD_SIZE[0])
+            options = dict(CARD_OPTIONS)
+            if format_ is not None:
+                options['format'] = format_
+            variants[card_variant(width, format_)] = (
+                f'{width}x{height}', options)
+    return variants
+
+
+# Миниатюры, которые выводятся в шаблонах: геометрия и опции sorl.
+THUMBNAIL_VARIANTS = card_variants()
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, которую создал бы get_thumbnail."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Как get_thumbnail, но без создания отсутствующей миниатюры."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def prefetch_thumbnails(posts):
+    """Находит готовые миниатюры всех постов одним чтением хранилища.
+
+    Результат сохраняется в post.thumbnails, и ready_thumbnail
+    больше не ходит за каждой миниатюрой в кэш по отдельности.
+    """
+    posts = [post for post in posts if post.image]
+    files = {
+        (post.pk, variant): backend.thumbnail_file(
+            post.image, geometry, **options)
+        for post in posts
+        for variant, (geometry, options) in THUMBNAIL_VARIANTS.items()
+    }
+    found = default.kvstore.get_many(files.values())
+    for post in posts:
+        post.thumbnails = {
+            variant: found[files[post.pk, variant].key]
+            for variant in THUMBNAIL_VARIANTS}
+
+
+def ready_thumbnail(post, variant='card'):
+    """Возвращает готовую миниатюру или None, ставя её в очередь."""
+    if not post.image:
+        return None
+    if hasattr(post, 'thumbnails'):
+        thumbnail = post.thumbnails[variant]
+    else:
+        geometry, options = THUMBNAIL_VARIANTS[variant]
+        thumbnail = backend.get_ready_thumbnail(
+            post.image, geometry, **options)
+    if thumbnail is None:
+        queue_thumbnails(post.pk, post.image.name)
+    return thumbnail
+
+
+# Форматы, в которых загрузка пересохраняется как есть; остальные
+# переводятся в JPEG, а картинки с прозрачностью - в PNG.
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def process_upload(upload):
+    """Уменьшает загруженную картинку и пересохраняет её без EXIF.
+
+    Размер проверяется по заголовку, до декодирования, поэтому
+    «бомба» из нескольких килобайт не успевает занять память.
+    Результат пишется во временный файл, который уходит на диск,
+    как только перерастает FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.width * image.height > settings.UPLOAD_IMAGE_MAX_PIXELS:
+        raise Image.DecompressionBombError(
+            f'{image.width}x{image.height} больше допустимого')
+    if getattr(image, 'is_animated', False):
+        # Кадры анимации не пересобираем, сохраняем как загрузили.
+        upload.seek(0)
+        return upload
+    format_ = image.format
+    max_edge = settings.UPLOAD_IMAGE_MAX_EDGE
+    # JPEG умеет сразу декодироваться в уменьшенном масштабе.
+    image.draft('RGB', (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    if format_ not in UPLOAD_FORMATS:
+        format_ = 'PNG' if has_alpha else 'JPEG'
+    options = {}
+    if format_ in ('JPEG', 'WEBP'):
+        options['quality'] = settings.UPLOAD_IMAGE_QUALITY
+    if format_ == 'JPEG':
+        options.update(optimize=True, progressive=True)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    elif format_ == 'PNG':
+        options['optimize'] = True
+    elif format_ == 'GIF' and 'transparency' in image.info:
+        options['transparency'] = image.info['transparency']
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    # Метаданные не передаются в save, поэтому в файл они не попадут.
+    image.save(output, format_, **options)
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=f'{name}.{UPLOAD_FORMATS[format_]}')
+
+
+# Заглушка карточки: ширина в пикселях и качество сжатия.
+PLACEHOLDER_WIDTH = 20
+PLACEHOLDER_QUALITY = 50
+
+# Ошибки чтения файла картинки: нет файла, не картинка, путь вне MEDIA_ROOT.
+READ_ERRORS = (OSError, ValueError, SuspiciousOperation)
+
+
+def make_placeholder(image):
+    """Крошечная копия кадра карточки в data URI и средний цвет.
+
+    Браузер растягивает её с размытием, пока грузится миниатюра.
+    """
+    size = (PLACEHOLDER_WIDTH,
+            round(PLACEHOLDER_WIDTH * CARD_SIZE[1] / CARD_SIZE[0]))
+    # Большой JPEG декодируется сразу в уменьшенном масштабе.
+    image.draft('RGB', (size[0] * 4, size[1] * 4))
+    small = ImageOps.fit(image.convert('RGB'), size, Image.LANCZOS)
+    color = '#{:02x}{:02x}{:02x}'.format(
+        *small.resize((1, 1), Image.BOX).getpixel((0, 0)))
+    format_ = 'WEBP' if 'WEBP' in Image.SAVE else 'PNG'
+    content = BytesIO()
+    small.save(content, format_, quality=PLACEHOLDER_QUALITY)
+    data = base64.b64encode(content.getvalue()).decode()
+    return f'data:image/{format_.lower()};base64,{data}', color
+
+
+def read_metadata(file_):
+    """Размеры, вес, SHA-256 и заглушка картинки для ImageMetadata."""
+    was_closed = file_.closed
+    file_.open('rb')
+    try:
+        digest = hashlib.sha256()
+        for chunk in file_.chunks():
+            digest.update(chunk)
+        file_.seek(0)
+        with Image.open(file_) as image:
+            width, height = image.size
+            placeholder, color = make_placeholder(image)
+        file_.seek(0)
+        return {
+            'image_width': width,
+            'image_height': height,
+            'image_size': file_.size,
+            'image_hash': digest.hexdigest(),
+            'image_placeholder': placeholder,
+            'image_color': color,
+        }
+    finally:
+        # Загруженный файл ещё предстоит сохранить, его не закрываем.
+        if was_closed:
+            file_.close()
+
+
+def update_metadata(instance, saved_name):
+    """Обновляет метаданные, если картинка объекта сменилась.
+
+    Битый файл не мешает сохранению: поля остаются пустыми,
+    и их потом заполнит backfill_image_metadata.
+    """
+    if (instance.image.name or '') == (saved_name or ''):
+        return
+    metadata = {
+        'image_width': None,
+        'image_height': None,
+        'image_size': None,
+        'image_hash': '',
+        'image_placeholder': '',
+        'image_color': '',
+    }
+    if instance.image:
+        try:
+            metadata = read_metadata(instance.image)
+        except READ_ERRORS:
+            pass
+    for field, value in metadata.items():
+        setattr(instance, field, value)
+
+
+def render_variants(image):
+    """Создаёт все варианты миниатюр картинки."""
+    for geometry, options in THUMBNAIL_VARIANTS.values():
+        get_thumbnail(image, geometry, **options)
+
+
+def missing_variants(image):
+    """Варианты, которых нет в хранилище sorl после render_variants.
+
+    Битую или пропавшую картинку get_thumbnail только пишет в лог
+    и ничего не сохраняет, поэтому успех проверяется по хранилищу.
+    """
+    files = {
+        variant: backend.thumbnail_file(image, geometry, **options)
+        for variant, (geometry, options) in THUMBNAIL_VARIANTS.items()}
+    found = default.kvstore.get_many(files.values())
+    return [variant for variant, file_ in files.items()
+            if found[file_.key] is None]
+
+
+def srcset(post, format_=None):
+    """Строка srcset из готовых ширин карточки в одном формате."""
+    candidates = []
+    for width in CARD_WIDTHS:
+        thumbnail = ready_thumbnail(post, card_variant(width, format_))
+        if thumbnail is not None:
+            candidates.append(f'{thumbnail.url} {width}w')
+    return ', '.join(candidates)
+
+
+def ready_picture(post):
+    """Собирает готовые варианты карточки для <picture> или None.
+
+    Без основной миниатюры картинку не показываем; недостающие
+    ширины и форматы просто пропускаются, пока создаются в фоне.
+    """
+    image = ready_thumbnail(post)
+    if image is None:
+        return None
+    sources = []
+    for format_ in CARD_FORMATS:
+        candidates = srcset(post, format_)
+        if candidates:
+            sources.append({
+                'type': f'image/{format_.lower()}',
+                'srcset': candidates,
+            })
+    return {'image': image, 'srcset': srcset(post), 'sources': sources}
+
+
+# Сколько секунд страницы не ставят в очередь миниатюры картинки,
+# из которой их не удалось создать.
+BROKEN_IMAGE_TIMEOUT = 60 * 60 * 24
+
+
+class ThumbnailsNotCreated(Exception):
+    pass
+
+
+def broken_key(post_id, name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'thumbnails_broken:{post_id}:{digest}'
+
+
+@task(key='thumbnails:{0}')
+def generate_thumbnails(post_id):
+    try:
+        post = Post.objects.filter(pk=post_id).only('image').first()
+        if post is None or not post.image:
+            return
+        render_variants(post.image)
+        missing = missing_variants(post.image)
+        if missing:
+            # Задачу повторит очередь, а страницы её больше не ставят:
+            # иначе каждый круг сбрасывал бы кэш всех лент.
+            default_cache.set(broken_key(post_id, post.image.name), True,
+                              BROKEN_IMAGE_TIMEOUT)
+            raise ThumbnailsNotCreated(
+                f'{post.image.name}: нет миниатюр {", ".join(missing)}')
+        default_cache.delete(broken_key(post_id, post.image.name))
+        # Карточки с заглушкой вместо картинки нужно перерисовать.
+        cache.bump_version('post', post_id)
+        cache.bump_version('feed', 'index')
+    finally:
+        default_cache.delete(f'thumbnails_queued:{post_id}')
+
+
+def queue_thumbnails(post_id, name):
+    """Ставит создание миниатюр поста в очередь задач.
+
+    Отметка в кэше не даёт каждой странице с недостающей миниатюрой
+    писать в таблицу задач, а картинка, из которой миниатюры создать
+    не удалось, не ставится вовсе.
+    """
+    if default_cache.get(broken_key(post_id, name)):
+        return
+    if default_cache.add(f'thumbnails_queued:{post_id}', True, 60 * 5):
+        generate_thumbnails.delay(post_id)
@@ -0,0 +1,54 @@
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+# Отсутствие миниатюры помнится недолго: её может создать воркер,
+# который с кэшем в памяти процесса не сбросит эту запись.
+MISSING_TIMEOUT = 60
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище sorl в кэше и базе, умеющее читать пачкой."""
+
+    def _get_raw(self, key):
+        """Как у sorl, но отсутствие кэшируется на MISSING_TIMEOUT."""
+        value = self.cache.get(key)
+        if value is None:
+            try:
+                value = KVStoreModel.objects.get(key=key).value
+            except KVStoreModel.DoesNotExist:
+                self.cache.set(
+                    key, cached_db_kvstore.EMPTY_VALUE, MISSING_TIMEOUT)
+                return None
+            self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        if value == cached_db_kvstore.EMPTY_VALUE:
+            return None
+        return value
+
+    def get_many(self, image_files):
+        """Находит несколько картинок: одно обращение к кэшу и к базе.
+
+        Возвращает словарь {ключ картинки: ImageFile или None}.
+        """
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            self.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+            # Отсутствующие тоже кэшируем, как это делает _get_raw.
+            absent = {key: cached_db_kvstore.EMPTY_VALUE
+                      for key in missing if key not in found}
+            self.cache.set_many(absent, MISSING_TIMEOUT)
+            values.update(found)
+            values.update(absent)
+        return {
+            image_key: (
+                None if values[key] == cached_db_kvstore.EMPTY_VALUE
+                else deserialize_image_file(values[key]))
+            for key, image_key in keys.items()
+        }
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import images
+from posts.management.utils import batches
+from posts.models import Group, Post
+
+BATCH_SIZE = 500
+METADATA_FIELDS = [
+    'image_width', 'image_height', 'image_size', 'image_hash',
+    'image_placeholder', 'image_color',
+]
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, вес, хэш и заглушки картинок '
+            'постов и групп.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк обновлять одним запросом.')
+
+    def handle(self, *args, **options):
+        for model in (Post, Group):
+            queryset = model.objects.exclude(image='').exclude(
+                image__isnull=True).filter(
+                    Q(image_hash='') | Q(image_color=''))
+            filled = failed = 0
+            for pks in batches(queryset, options['batch_size']):
+                changed = []
+                for instance in model.objects.filter(pk__in=pks).only(
+                        'image', *METADATA_FIELDS):
+                    try:
+                        metadata = images.read_metadata(instance.image)
+                    except images.READ_ERRORS as error:
+                        failed += 1
+                        self.stderr.write(f'{instance.image.name}: {error}')
+                        continue
+                    for field, value in metadata.items():
+                        setattr(instance, field, value)
+                    changed.append(instance)
+                model.objects.bulk_update(changed, METADATA_FIELDS)
+                filled += len(changed)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: заполнено {filled}, '
+                f'ошибок {failed}'))
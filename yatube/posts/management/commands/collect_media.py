@@ -0,0 +1,105 @@
+import os
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Group, Post, StoredFile
+from posts.storage import content_storage, is_content_name
+
+BATCH_SIZE = 500
+# Каталоги upload_to, которые лежат в хранилище по содержимому.
+MEDIA_DIRS = ('posts', 'groups')
+
+
+def referenced(names):
+    """Какие из имён на самом деле записаны в постах и группах."""
+    found = set()
+    for model in (Post, Group):
+        found.update(model.objects.filter(
+            image__in=names).values_list('image', flat=True))
+    return found
+
+
+def stored_names(directory):
+    """Имена файлов хранилища по содержимому в каталоге upload_to."""
+    if not content_storage.exists(directory):
+        return
+    shards, _ = content_storage.listdir(directory)
+    for shard in shards:
+        _, files = content_storage.listdir(os.path.join(directory, shard))
+        for file_name in files:
+            name = f'{directory}/{shard}/{file_name}'
+            if is_content_name(name):
+                yield name
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы хранилища по содержимому, на которые '
+            'больше не ссылается ни один пост или группа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=24 * 60 * 60,
+            help='Сколько секунд не трогать недавно изменённые файлы.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.deadline = time.time() - options['grace']
+        removed = fixed = 0
+        # Файлы, на которые по счётчику никто не ссылается.
+        orphans = StoredFile.objects.filter(
+            references=0,
+            changed__lt=timezone.now() - timedelta(seconds=options['grace']))
+        last_name = ''
+        while True:
+            names = list(orphans.filter(name__gt=last_name).order_by(
+                'name').values_list('name', flat=True)[:BATCH_SIZE])
+            if not names:
+                break
+            last_name = names[-1]
+            alive = referenced(names)
+            # Счётчик разошёлся с данными: файл нужен, чиним счётчик.
+            for name in alive:
+                fixed += 1
+                if not self.dry_run:
+                    StoredFile.objects.filter(name=name).update(
+                        references=sum(
+                            model.objects.filter(image=name).count()
+                            for model in (Post, Group)))
+            for name in set(names) - alive:
+                removed += self.remove(name)
+        # Файлы без записи: загрузка, транзакция которой откатилась.
+        for directory in MEDIA_DIRS:
+            names = stored_names(directory)
+            while True:
+                batch = list(islice(names, BATCH_SIZE))
+                if not batch:
+                    break
+                known = set(StoredFile.objects.filter(
+                    name__in=batch).values_list('name', flat=True))
+                unknown = set(batch) - known
+                for name in unknown - referenced(unknown):
+                    removed += self.remove(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {removed}, исправлено счётчиков: {fixed}'))
+
+    def remove(self, name):
+        """Удаляет файл вместе с миниатюрами, если он давно не менялся."""
+        if content_storage.exists(name):
+            if os.path.getmtime(content_storage.path(name)) > self.deadline:
+                return 0
+        self.stdout.write(f'Удаляется {name}')
+        if self.dry_run:
+            return 1
+        default.kvstore.delete(ImageFile(name, content_storage))
+        content_storage.delete(name)
+        StoredFile.objects.filter(name=name).delete()
+        return 1
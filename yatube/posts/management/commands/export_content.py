@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты или комментарии в NDJSON, '
+            'по строке на объект.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=tuple(export.KINDS))
+        parser.add_argument(
+            '--output', help='Файл для выгрузки; по умолчанию stdout.')
+        parser.add_argument('--author', help='Имя пользователя автора.')
+        parser.add_argument('--group', help='Slug группы.')
+        parser.add_argument(
+            '--since', help='Начало периода: дата или дата и время.')
+        parser.add_argument(
+            '--until', help='Конец периода: дата или дата и время.')
+        parser.add_argument(
+            '--batch-size', type=int, default=export.BATCH_SIZE,
+            help='Сколько строк читать из базы за один запрос.')
+
+    def handle(self, *args, **options):
+        filters = {key: options[key]
+                   for key in ('author', 'group', 'since', 'until')}
+        try:
+            lines = export.ndjson(
+                options['kind'], options['batch_size'], **filters)
+        except ValueError as error:
+            raise CommandError(error)
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Выгружено строк: {count}'))
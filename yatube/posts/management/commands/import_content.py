@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from posts import cache, counters, images, timeline
+from posts.models import Comment, Follow, Group, Post, User
+from posts.storage import content_storage
+
+BATCH_SIZE = 1000
+FORMATS = ('jsonl', 'csv')
+
+
+class RowError(Exception):
+    pass
+
+
+class Lookup:
+    """Соответствие естественного ключа и id, дочитываемое пачками."""
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.ids = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key and key not in self.ids}
+        if missing:
+            self.ids.update(self.queryset.filter(
+                **{f'{self.field}__in': missing}
+            ).values_list(self.field, 'pk'))
+
+    def get(self, key):
+        try:
+            return self.ids[key]
+        except KeyError:
+            raise RowError(f'не найден {self.field} {key!r}')
+
+
+@contextmanager
+def keep_dates(*fields):
+    """Не даёт auto_now_add затереть даты из файла при bulk_create."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def read_rows(path, format_):
+    with open(path, encoding='utf-8', newline='') as file:
+        if format_ == 'csv':
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise RowError(f'некорректная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из JSONL или CSV '
+            'пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=('posts', 'comments', 'follows'))
+        parser.add_argument('path', help='Файл с данными.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию - по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк сохранять в одной транзакции.')
+        parser.add_argument(
+            '--images',
+            help='Каталог, относительно которого указаны картинки постов.')
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных пользователей без пароля.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, где прервался прошлый запуск.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл прогресса; по умолчанию рядом с файлом данных.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format_ = options['format'] or os.path.splitext(path)[1][1:].lower()
+        if format_ not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {format_}')
+        self.kind = options['kind']
+        self.images_dir = options['images']
+        self.create_users = options['create_users']
+        self.checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        self.users = Lookup(User.objects, 'username')
+        self.groups = Lookup(Group.objects, 'slug')
+        self.posts = Lookup(Post.objects, 'pk')
+        state = {'row': 0, 'authors': [], 'groups': []}
+        if options['resume'] and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as file:
+                state = json.load(file)
+        rows = islice(read_rows(path, format_), state['row'], None)
+        started = time.monotonic()
+        imported = failed = 0
+        with keep_dates(Post._meta.get_field('pub_date'),
+                        Comment._meta.get_field('created')):
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    saved, errors = self.import_batch(batch, state)
+                state['row'] += len(batch)
+                self.save_state(state)
+                imported += saved
+                failed += len(errors)
+                for number, error in errors:
+                    self.stderr.write(f'Строка {number}: {error}')
+                rate = imported / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'Строк: {state["row"]}, сохранено {imported}, '
+                    f'ошибок {failed}, {rate:.0f} строк/с')
+        self.finish(state)
+        # Пустой файл не даёт ни одной пачки, и отметки нет.
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён: сохранено {imported}, ошибок {failed}'))
+
+    def import_batch(self, batch, state):
+        """Сохраняет пачку строк, возвращает число строк и ошибки."""
+        self.users.load(
+            row.get(field) for row in batch
+            for field in ('author', 'user'))
+        self.groups.load(row.get('group') for row in batch)
+        if self.kind == 'posts':
+            # bulk_create с занятым id уронил бы всю пачку.
+            self.taken_ids = set(Post.objects.filter(pk__in=[
+                int(row['id']) for row in batch
+                if str(row.get('id', '')).isdigit()
+            ]).values_list('pk', flat=True))
+        if self.kind == 'comments':
+            self.posts.load(int(row['post']) for row in batch
+                            if str(row.get('post', '')).isdigit())
+        if self.create_users:
+            self.add_users(batch)
+        build = getattr(self, f'build_{self.kind[:-1]}')
+        objects, errors = [], []
+        for number, row in enumerate(batch, start=state['row'] + 1):
+            try:
+                objects.append(build(row))
+            except (RowError, KeyError, ValueError) as error:
+                errors.append((number, error))
+        if objects:
+            getattr(self, f'save_{self.kind}')(objects, state)
+        return len(objects), errors
+
+    def save_posts(self, posts, state):
+        Post.objects.bulk_create(posts)
+        for name, count in self.count_files(posts).items():
+            counters.change_file_references(name, count)
+        authors = {post.author_id for post in posts}
+        counters.recount_users(list(authors))
+        state['authors'] = sorted(set(state['authors']) | authors)
+        state['groups'] = sorted(set(state['groups']) | {
+            post.group_id for post in posts if post.group_id})
+
+    def save_comments(self, comments, state):
+        Comment.objects.bulk_create(comments)
+        posts = {comment.post_id for comment in comments}
+        counters.recount_posts(list(posts))
+        cache.bump_versions('comments', posts)
+
+    def save_follows(self, follows, state):
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        for follow in follows:
+            timeline.backfill(follow.user_id, follow.author_id)
+        users = ({follow.user_id for follow in follows}
+                 | {follow.author_id for follow in follows})
+        counters.recount_users(list(users))
+        cache.bump_versions('follows', users)
+
+    def add_users(self, batch):
+        names = {row.get(field) for row in batch
+                 for field in ('author', 'user')}
+        missing = {name for name in names
+                   if name and name not in self.users.ids}
+        new_users = []
+        for name in missing:
+            user = User(username=name)
+            user.set_unusable_password()
+            new_users.append(user)
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+        self.users.load(missing)
+
+    def build_post(self, row):
+        post = Post(
+            text=row['text'],
+            author_id=self.users.get(row['author']),
+            group_id=(self.groups.get(row['group'])
+                      if row.get('group') else None),
+            pub_date=parse_date(row.get('pub_date')),
+        )
+        if row.get('id'):
+            post.pk = int(row['id'])
+            if post.pk in self.taken_ids:
+                raise RowError(f'пост с id {post.pk} уже есть')
+            self.taken_ids.add(post.pk)
+        if row.get('image'):
+            self.attach_image(post, row['image'])
+        return post
+
+    def build_comment(self, row):
+        return Comment(
+            post_id=self.posts.get(int(row['post'])),
+            author_id=self.users.get(row['author']),
+            text=row['text'],
+            created=parse_date(row.get('created')),
+        )
+
+    def build_follow(self, row):
+        user_id = self.users.get(row['user'])
+        author_id = self.users.get(row['author'])
+        if user_id == author_id:
+            raise RowError('подписка на самого себя')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def attach_image(self, post, relative_path):
+        """Кладёт картинку в хранилище так же, как загрузку из формы."""
+        if not self.images_dir:
+            raise RowError('картинка указана, но не задан --images')
+        path = os.path.join(self.images_dir, relative_path)
+        try:
+            with open(path, 'rb') as file:
+                upload = images.process_upload(
+                    File(file, name=os.path.basename(path)))
+                post.image = content_storage.save(
+                    f'posts/{upload.name}', upload)
+            for field, value in images.read_metadata(post.image).items():
+                setattr(post, field, value)
+        except (*images.READ_ERRORS, Image.DecompressionBombError) as error:
+            raise RowError(f'картинка {relative_path}: {error}')
+
+    def count_files(self, posts):
+        files = {}
+        for post in posts:
+            if post.image:
+                files[post.image.name] = files.get(post.image.name, 0) + 1
+        return files
+
+    def finish(self, state):
+        """То, что при обычном сохранении делают сигналы."""
+        if self.kind != 'posts':
+            return
+        followers = Follow.objects.filter(
+            author_id__in=state['authors']).values_list(
+                'user_id', flat=True).distinct()
+        for user_id in followers.iterator():
+            with transaction.atomic():
+                timeline.rebuild(user_id)
+        feeds = ['index'] + [f'author:{pk}' for pk in state['authors']]
+        feeds += [f'group:{pk}' for pk in state['groups']]
+        cache.forget_feed_counts(feeds)
+        cache.bump_version('feed', 'index')
+
+    def save_state(self, state):
+        with open(self.checkpoint, 'w') as file:
+            json.dump(state, file)
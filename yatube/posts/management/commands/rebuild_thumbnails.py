@@ -0,0 +1,123 @@
+import json
+import os
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.images import ImageFile
+
+from posts import cache, images
+from posts.management.pools import ProcessPool
+from posts.models import Group, Post
+from posts.storage import content_storage
+
+BATCH_SIZE = 200
+
+
+def render_image(name):
+    """Создаёт миниатюры одного файла, возвращает текст ошибки или None."""
+    try:
+        # Ключи sorl учитывают хранилище, поэтому берём то же, что у полей.
+        images.render_variants(ImageFile(name, content_storage))
+    except Exception as error:
+        return f'{name}: {error}'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Заново создаёт миниатюры картинок постов и групп '
+            'в нескольких процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Только посты, опубликованные с этой даты (ГГГГ-ММ-ДД).')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 - работать в текущем процессе.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько картинок обрабатывать между отметками прогресса.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, где прервался прошлый запуск.')
+        parser.add_argument(
+            '--checkpoint', default=os.path.join(
+                settings.CACHE_DIR, 'rebuild_thumbnails.json'),
+            help='Файл, в котором хранится прогресс.')
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        since = options['since']
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if since is not None:
+            posts = posts.filter(pub_date__date__gte=since)
+        # У групп нет даты, их картинок мало - они обновляются всегда.
+        sources = {
+            'post': posts,
+            'group': Group.objects.exclude(image=''),
+        }
+        state = {'since': since and since.isoformat()}
+        if options['resume']:
+            saved = self.load_state()
+            if saved.get('since') == state['since']:
+                state = saved
+        pool = None
+        if options['workers']:
+            pool = ProcessPool(max_workers=options['workers'])
+        try:
+            failed = []
+            for kind, queryset in sources.items():
+                failed += self.rebuild(
+                    kind, queryset, state, pool, options['batch_size'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        for error in failed:
+            self.stderr.write(error)
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры обновлены, ошибок: {len(failed)}'))
+
+    def rebuild(self, kind, queryset, state, pool, size):
+        last_pk = state.get(kind, 0)
+        total = queryset.count()
+        done = queryset.filter(pk__lte=last_pk).count()
+        started = time.monotonic()
+        processed = 0
+        failed = []
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', 'image')[:size])
+            if not rows:
+                return failed
+            pks, names = zip(*rows)
+            if pool is None:
+                results = map(render_image, names)
+            else:
+                results = pool.map(render_image, names)
+            failed += [error for error in results if error]
+            if kind == 'post':
+                cache.bump_versions('post', pks)
+                cache.bump_version('feed', 'index')
+            last_pk = state[kind] = pks[-1]
+            self.save_state(state)
+            processed += len(rows)
+            done += len(rows)
+            rate = processed / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{kind}: {done}/{total}, {rate:.1f} картинок/с')
+
+    def load_state(self):
+        try:
+            with open(self.checkpoint) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.checkpoint) or '.', exist_ok=True)
+        with open(self.checkpoint, 'w') as file:
+            json.dump(state, file)
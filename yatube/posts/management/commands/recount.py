@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+from posts.management.utils import batches
+from posts.models import Post, User
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк пересчитывать в одной транзакции.')
+
+    def handle(self, *args, **options):
+        size = options['batch_size']
+        fixed_users = fixed_posts = 0
+        for user_ids in batches(User.objects.all(), size):
+            with transaction.atomic():
+                fixed_users += counters.recount_users(user_ids)
+        for post_ids in batches(Post.objects.all(), size):
+            with transaction.atomic():
+                fixed_posts += counters.recount_posts(post_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков пользователей: {fixed_users}, '
+            f'постов: {fixed_posts}'))
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import queue
+from posts.management.pools import ProcessPool
+
+
+def run_task(pk):
+    """Выполняет задачу в потоке или процессе пула."""
+    try:
+        return queue.run(pk)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди в нескольких '
+            'потоках или процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASK_WORKERS,
+            help='Число потоков или процессов; 0 - работать '
+                 'в текущем потоке.')
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Выполнять задачи в процессах, а не в потоках.')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда в очереди не останется готовых задач.')
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Сколько секунд ждать новых задач между проверками.')
+
+    def handle(self, *args, **options):
+        self.done = self.failed = 0
+        try:
+            if options['workers']:
+                self.work_in_pool(options)
+            else:
+                self.work_inline(options)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {self.done}, с ошибкой: {self.failed}'))
+
+    def report(self, error):
+        if error is None:
+            self.done += 1
+        else:
+            self.failed += 1
+            self.stderr.write(error)
+
+    def work_inline(self, options):
+        while True:
+            claimed = queue.claim(1)
+            if not claimed:
+                if options['burst']:
+                    return
+                time.sleep(options['poll'])
+                continue
+            self.report(queue.run(claimed[0]))
+
+    def work_in_pool(self, options):
+        workers = options['workers']
+        if options['processes']:
+            pool = ProcessPool(max_workers=workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+        running = set()
+        try:
+            while True:
+                claimed = queue.claim(workers - len(running))
+                for pk in claimed:
+                    running.add(pool.submit(run_task, pk))
+                if not running:
+                    if options['burst']:
+                        return
+                    time.sleep(options['poll'])
+                    continue
+                finished, running = wait(
+                    running, timeout=options['poll'],
+                    return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self.report(future.result())
+        finally:
+            # Забирается не больше задач, чем свободных воркеров,
+            # поэтому при остановке все забранные задачи доделываются.
+            pool.shutdown()
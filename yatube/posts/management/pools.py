@@ -0,0 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+
+
+class ProcessPool(ProcessPoolExecutor):
+    """Пул процессов для команд, которые работают с базой.
+
+    Процесс пула может запуститься при любой отправке задачи и при
+    fork унаследует открытые соединения, поэтому перед отправкой они
+    закрываются: каждый процесс откроет своё.
+    """
+
+    def submit(self, *args, **kwargs):
+        connections.close_all()
+        return super().submit(*args, **kwargs)
@@ -0,0 +1,10 @@
+def batches(queryset, size):
+    """Отдаёт id строк пачками по возрастанию первичного ключа."""
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_content_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Уменьшенная копия картинки в виде data URI', verbose_name='Заглушка картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Уменьшенная копия картинки в виде data URI', verbose_name='Заглушка картинки'),
+        ),
+    ]
@@ -1,11 +1,48 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .storage import content_storage
 
 
 User = get_user_model()
 
 
-class Post(models.Model):
+class ImageMetadata(models.Model):
+    """Сведения о картинке, чтобы не открывать её файл при выводе."""
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        editable=False)
+    image_size = models.PositiveIntegerField(
+        'Размер картинки в байтах',
+        null=True,
+        editable=False)
+    image_hash = models.CharField(
+        'SHA-256 картинки',
+        max_length=64,
+        blank=True,
+        editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False,
+        help_text='Уменьшенная копия картинки в виде data URI')
+    image_color = models.CharField(
+        'Основной цвет картинки',
+        max_length=7,
+        blank=True,
+        editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class Post(ImageMetadata):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -29,26 +66,40 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=content_storage,
         null=True,
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
-class Group(models.Model):
+class Group(ImageMetadata):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField()
     image = models.ImageField(
         'Картинка',
         upload_to='groups/',
+        storage=content_storage,
         blank=True
     )
 
@@ -74,6 +125,13 @@ class Comment(models.Model):
     text = models.TextField('Текст', help_text='Текст нового комментария')
     created = models.DateTimeField(auto_now_add=True, null=True)
 
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.text[:200]
 
@@ -100,3 +158,155 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['author', 'user'], name='unique_follower')
         ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='follow_user_author_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, разложенная по подписчикам при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date', '-id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-id'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class StoredFile(models.Model):
+    """Файл хранилища по содержимому и число ссылок на него."""
+    name = models.CharField(
+        'Имя в хранилище',
+        max_length=100,
+        primary_key=True)
+    references = models.PositiveIntegerField(
+        'Число ссылок',
+        default=0)
+    changed = models.DateTimeField(
+        'Изменён',
+        auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+        indexes = [
+            models.Index(fields=['references', 'changed'],
+                         name='storedfile_references_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди; выполняет её команда runworker."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+    name = models.CharField(
+        'Функция',
+        max_length=200)
+    arguments = models.TextField(
+        'Аргументы',
+        default='[]',
+        help_text='Позиционные аргументы функции в JSON')
+    key = models.CharField(
+        'Ключ',
+        max_length=200,
+        null=True,
+        blank=True,
+        help_text='Пока задача с этим ключом ждёт, такая же не ставится')
+    state = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATES,
+        default=PENDING)
+    attempts = models.PositiveSmallIntegerField(
+        'Неудачных попыток',
+        default=0)
+    run_at = models.DateTimeField(
+        'Выполнить после',
+        default=timezone.now)
+    locked_until = models.DateTimeField(
+        'Занята воркером до',
+        null=True,
+        blank=True)
+    error = models.TextField(
+        'Последняя ошибка',
+        blank=True)
+    created = models.DateTimeField(
+        'Создана',
+        auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(fields=['state', 'run_at'],
+                         name='task_state_run_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(state='pending'),
+                name='task_pending_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} {self.arguments}'
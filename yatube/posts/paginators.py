@@ -0,0 +1,220 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import feed_count_key
+
+CURSOR_SEPARATOR = '|'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(post, number):
+    """Упаковывает ключ (pub_date, id) и номер страницы в токен."""
+    raw = CURSOR_SEPARATOR.join(
+        (post.pub_date.isoformat(), str(post.pk), str(number)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        pub_date, pk, number = raw.split(CURSOR_SEPARATOR)
+        pub_date = parse_datetime(pub_date)
+        pk, number = int(pk), int(number)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Некорректный курсор страницы')
+    if pub_date is None or number < 1:
+        raise InvalidCursor('Некорректный курсор страницы')
+    return pub_date, pk, number
+
+
+def estimate_count(queryset, threshold):
+    """Точно считает небольшие выборки и оценивает большие.
+
+    queryset должен идти от новых id к старым. Для оценки читается
+    по индексу не больше порога строк: доля подходящих строк среди
+    свежих id переносится на более старые id.
+    """
+    pks = queryset.values_list('pk', flat=True)
+    tail = list(pks[threshold - 1:threshold + 1])
+    if len(tail) < 2:
+        return queryset.count()
+    newest_pk, threshold_pk = pks[0], tail[0]
+    density = min(threshold / max(newest_pk - threshold_pk + 1, 1), 1)
+    first_pk = queryset.model.objects.aggregate(first=Min('pk'))['first']
+    older = max(threshold_pk - first_pk, 1)
+    return threshold + max(round(density * older), 1)
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id).
+
+    Переход по ?after= и ?before= читает из базы только нужную страницу
+    без OFFSET, ссылки вида ?page= продолжают работать как раньше.
+    Страницы остаются обычными Page, курсоры соседних страниц
+    доступны как page.next_cursor и page.previous_cursor, номера для
+    ссылок на страницы - как page.page_window. Последняя страница,
+    ?page=last, читается с конца ленты по тому же ключу.
+    """
+    ordering = ('-pub_date', '-id')
+    ELLIPSIS = '…'
+    LAST_PAGE = 'last'
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list.order_by(*self.ordering),
+                         per_page, **kwargs)
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        """Номера страниц вокруг текущей и по краям, пропуски - ELLIPSIS.
+
+        Повторяет Paginator.get_elided_page_range из Django 3.2.
+        """
+        number = max(min(number, self.num_pages), 1)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            return list(self.page_range)
+        pages = []
+        if number > (1 + on_each_side + on_ends) + 1:
+            pages.extend(range(1, on_ends + 1))
+            pages.append(self.ELLIPSIS)
+            pages.extend(range(number - on_each_side, number + 1))
+        else:
+            pages.extend(range(1, number + 1))
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            pages.extend(range(number + 1, number + on_each_side + 1))
+            pages.append(self.ELLIPSIS)
+            pages.extend(
+                range(self.num_pages - on_ends + 1, self.num_pages + 1))
+        else:
+            pages.extend(range(number + 1, self.num_pages + 1))
+        return pages
+
+    def get_page(self, number=None, after=None, before=None):
+        if after or before:
+            try:
+                return self.cursor_page(after=after, before=before)
+            except InvalidCursor:
+                return self.cursor_page()
+        if number is None:
+            return self.cursor_page()
+        if number == self.LAST_PAGE:
+            return self.last_page()
+        page = super().get_page(number)
+        page.object_list = list(page.object_list)
+        return self.add_navigation(page)
+
+    def cursor_page(self, after=None, before=None):
+        queryset = self.object_list
+        number = 1
+        if before:
+            pub_date, pk, number = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).reverse()
+            object_list = list(queryset[:self.per_page + 1])
+            # Если до начала ленты меньше страницы, значит это первая.
+            if len(object_list) <= self.per_page:
+                number = 1
+            object_list = object_list[:self.per_page][::-1]
+            # За страницей, открытой назад, лежит хотя бы строка курсора.
+            has_more = bool(object_list)
+        else:
+            if after:
+                pub_date, pk, number = decode_cursor(after)
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, pk__lt=pk))
+            object_list = list(queryset[:self.per_page + 1])
+            has_more = len(object_list) > self.per_page
+            object_list = object_list[:self.per_page]
+        page = Page(object_list, number, self)
+        self.fix_count(page, has_more)
+        return self.add_navigation(page)
+
+    def last_page(self):
+        """Самые старые объекты: индекс читается с обратного конца.
+
+        Размер страницы берётся из count, чтобы границы совпадали
+        со страницами ?page=; если count оценён и не сходится,
+        последней считается полная страница.
+        """
+        size = self.count - (self.num_pages - 1) * self.per_page
+        if not 0 < size <= self.per_page:
+            size = self.per_page
+        object_list = list(self.object_list.reverse()[:size])[::-1]
+        return self.add_navigation(Page(object_list, self.num_pages, self))
+
+    def fix_count(self, page, has_more):
+        """Сверяет число объектов с тем, что страница увидела в базе.
+
+        Если count взят из кэша или оценен приблизительно, соседство
+        страниц всё равно определяется по данным, а не по счётчику.
+        """
+        seen = (page.number - 1) * self.per_page + len(page.object_list)
+        if has_more and not page.has_next():
+            self.set_count(seen + 1)
+        elif not has_more and page.has_next():
+            self.set_count(seen)
+
+    def set_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+
+    def add_navigation(self, page):
+        page.page_window = self.get_elided_page_range(page.number)
+        page.next_cursor = page.previous_cursor = None
+        if page.object_list and page.has_next():
+            page.next_cursor = encode_cursor(
+                page.object_list[-1], page.number + 1)
+        if page.object_list and page.has_previous():
+            page.previous_cursor = encode_cursor(
+                page.object_list[0], page.number - 1)
+        return page
+
+
+class CachedCountPaginator(KeysetPaginator):
+    """Пагинатор, который не считает ленту на каждом запросе.
+
+    Число постов ленты feed хранится в кэше и меняется сигналами при
+    добавлении и удалении постов. Если в ленте больше, чем
+    FEED_COUNT_THRESHOLD постов, точный COUNT(*) заменяется оценкой.
+    Ленты без имени считаются как обычно.
+    """
+
+    def __init__(self, object_list, per_page, feed=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+
+    @cached_property
+    def count(self):
+        if self.feed is None:
+            return super().count
+        key = feed_count_key(self.feed)
+        count = cache.get(key)
+        if count is None:
+            count = self.estimate_count()
+            cache.set(key, count, settings.FEED_COUNT_TIMEOUT)
+        return count
+
+    def estimate_count(self):
+        return estimate_count(
+            self.object_list, settings.FEED_COUNT_THRESHOLD)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки: точный COUNT(*) только для небольших выборок."""
+
+    @cached_property
+    def count(self):
+        return estimate_count(
+            self.object_list.order_by('-pk'),
+            settings.ADMIN_COUNT_THRESHOLD)
@@ -0,0 +1,153 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача - функция с декоратором task. delay() записывает вызов
+в таблицу Task в той же транзакции, что и само изменение, поэтому
+воркер увидит задачу только после фиксации, а при откате её не будет.
+Выполняет задачи команда runworker. При TASKS_EAGER=True delay()
+выполняет задачу сразу, а в таблицу попадает только упавшая задача -
+так сайт работает без воркера.
+"""
+import functools
+import json
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+
+class TaskFunction:
+    """Функция, которую можно вызвать сразу или поставить в очередь."""
+
+    def __init__(self, func, key=None, retries=None):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.key = key
+        self.retries = retries
+        self.name = f'{func.__module__}.{func.__qualname__}'
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def delay(self, *args):
+        """Ставит вызов в очередь; False, если такой уже ждёт выполнения.
+
+        Аргументы должны переживать JSON: в режиме TASKS_EAGER они тоже
+        проходят через него, чтобы ошибка была видна сразу.
+        """
+        arguments = json.dumps(args)
+        error = None
+        if settings.TASKS_EAGER:
+            try:
+                self.func(*json.loads(arguments))
+                return True
+            except Exception:
+                # Запрос не падает: задача ложится в очередь с ошибкой,
+                # как после неудачи у воркера.
+                error = traceback.format_exc()
+        key = self.key.format(*args) if self.key else None
+        if key and Task.objects.filter(key=key, state=Task.PENDING).exists():
+            return False
+        try:
+            with transaction.atomic():
+                task_ = Task.objects.create(
+                    name=self.name, arguments=arguments, key=key)
+        except IntegrityError:
+            # Такую же задачу только что поставил другой запрос.
+            return False
+        if error is not None:
+            fail(task_, self.max_retries(), error)
+        return True
+
+    def max_retries(self):
+        if self.retries is None:
+            return settings.TASK_RETRIES
+        return self.retries
+
+
+def task(key=None, retries=None):
+    """Декоратор задачи.
+
+    key - шаблон str.format от аргументов: пока в очереди ждёт задача
+    с тем же ключом, новая не ставится. retries - сколько раз повторять
+    после ошибки, по умолчанию TASK_RETRIES.
+    """
+    def decorator(func):
+        return TaskFunction(func, key, retries)
+    return decorator
+
+
+def runnable():
+    """Задачи, которые можно забрать: ждущие и брошенные воркером."""
+    now = timezone.now()
+    return Task.objects.filter(
+        Q(state=Task.PENDING, run_at__lte=now)
+        | Q(state=Task.RUNNING, locked_until__lt=now))
+
+
+def claim(limit):
+    """Забирает до limit задач и возвращает их id.
+
+    Задача забрана, только если условный UPDATE изменил строку, поэтому
+    несколько воркеров не возьмут одну задачу и без SELECT FOR UPDATE.
+    """
+    claimed = []
+    candidates = runnable().order_by('run_at', 'pk').values_list(
+        'pk', flat=True)[:limit]
+    for pk in candidates:
+        locked_until = timezone.now() + timedelta(
+            seconds=settings.TASK_TIMEOUT)
+        if runnable().filter(pk=pk).update(
+                state=Task.RUNNING, locked_until=locked_until):
+            claimed.append(pk)
+    return claimed
+
+
+def retry_delay(attempts):
+    """Экспоненциальная пауза перед следующей попыткой."""
+    return timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def fail(task_, retries, error):
+    task_.attempts += 1
+    task_.error = error
+    task_.locked_until = None
+    if task_.attempts > retries:
+        task_.state = Task.FAILED
+    else:
+        task_.state = Task.PENDING
+        task_.run_at = timezone.now() + retry_delay(task_.attempts)
+    try:
+        with transaction.atomic():
+            task_.save()
+    except IntegrityError:
+        # Пока задача выполнялась, такую же поставили в очередь снова:
+        # повторять будет она.
+        Task.objects.filter(pk=task_.pk).delete()
+
+
+def run(pk):
+    """Выполняет забранную задачу; возвращает текст ошибки или None.
+
+    Удачная задача удаляется, неудачная ждёт повтора или остаётся
+    в таблице в состоянии FAILED.
+    """
+    task_ = Task.objects.filter(pk=pk).first()
+    if task_ is None:
+        return None
+    retries = 0
+    try:
+        function = import_string(task_.name)
+        retries = function.max_retries()
+        function(*json.loads(task_.arguments))
+    except Exception:
+        error = traceback.format_exc()
+        fail(task_, retries, error)
+        return f'{task_}: {error}'
+    Task.objects.filter(pk=pk).delete()
+    return None
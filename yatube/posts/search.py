@@ -0,0 +1,132 @@
+"""Полнотекстовый поиск по постам на FTS5 в SQLite.
+
+Индекс posts_post_fts хранит только токены, сам текст берётся из
+posts_post (external content). Синхронизацию делают триггеры базы,
+поэтому индекс не отстаёт и при QuerySet.update или bulk_create.
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+
+from .paginators import CURSOR_SEPARATOR, InvalidCursor
+
+FTS_TABLE = 'posts_post_fts'
+
+INSTALL_SQL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+)
+
+UNINSTALL_SQL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def install(using=connection, rebuild=False):
+    """Создаёт индекс и триггеры, если их ещё нет.
+
+    Миграции SQLite пересоздают таблицу posts_post при изменении
+    схемы и теряют её триггеры, поэтому install вызывается и после
+    каждого migrate.
+    """
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall(using=connection):
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def match_expression(query):
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс.
+
+    Слова берутся в кавычки, чтобы операторы FTS5 во вводе
+    не ломали запрос.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def encode_cursor(rank, pk):
+    raw = CURSOR_SEPARATOR.join((repr(rank), str(pk)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        rank, pk = raw.split(CURSOR_SEPARATOR)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Некорректный курсор поиска')
+
+
+def matching_ids(query):
+    """SQL и параметры подзапроса с id постов, подходящих под запрос."""
+    return (f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match_expression(query)])
+
+
+def search(queryset, query, per_page, after=None):
+    """Страница постов по релевантности и курсор следующей страницы.
+
+    Порядок - по bm25 (rank в FTS5), при равенстве по id; следующая
+    страница ищется по ключу (rank, id) без OFFSET. Некорректный
+    курсор даёт первую страницу.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    sql = (f'SELECT rowid, rank FROM {FTS_TABLE} '
+           f'WHERE {FTS_TABLE} MATCH %s')
+    params = [expression]
+    if after:
+        try:
+            rank, pk = decode_cursor(after)
+        except InvalidCursor:
+            pass
+        else:
+            sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+            params += [rank, rank, pk]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(*rows[-1][::-1])
+    posts = queryset.in_bulk([pk for pk, rank in rows])
+    return [posts[pk] for pk, rank in rows if pk in posts], next_cursor
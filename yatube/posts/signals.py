@@ -0,0 +1,136 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, images, search, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+    elif update_fields != {'last_login'}:
+        cache.bump_version('user', instance.pk)
+        cache.bump_version('feed', 'index')
+        # Имя комментатора выводится на страницах чужих постов.
+        cache.bump_versions('comments', Comment.objects.filter(
+            author=instance).values_list('post_id', flat=True).distinct())
+
+
+def post_feeds(author_id, group_id):
+    feeds = ['index', f'author:{author_id}']
+    if group_id is not None:
+        feeds.append(f'group:{group_id}')
+    return feeds
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    (instance.saved_author_id, instance.saved_group_id,
+     instance.saved_image) = Post.objects.filter(pk=instance.pk).values_list(
+        'author_id', 'group_id', 'image').first() or (None, None, '')
+    images.update_metadata(instance, instance.saved_image)
+
+
+def image_replaced(instance):
+    counters.change_file_references(instance.saved_image, -1)
+    counters.change_file_references(instance.image.name, 1)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    cache.bump_version('post', instance.pk)
+    cache.bump_version('feed', 'index')
+    if (instance.image.name or '') != (instance.saved_image or ''):
+        image_replaced(instance)
+        if instance.image:
+            images.queue_thumbnails(instance.pk, instance.image.name)
+    if created:
+        cache.change_feed_counts(
+            post_feeds(instance.author_id, instance.group_id), 1)
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+        return
+    if instance.saved_author_id != instance.author_id:
+        # Автора можно сменить в админке: пост переезжает к нему целиком.
+        cache.change_feed_counts([f'author:{instance.saved_author_id}'], -1)
+        cache.change_feed_counts([f'author:{instance.author_id}'], 1)
+        counters.change_user_counter(
+            instance.saved_author_id, 'posts_count', -1)
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        timeline.reassign(instance)
+    if instance.saved_group_id != instance.group_id:
+        if instance.saved_group_id is not None:
+            cache.change_feed_counts(
+                [f'group:{instance.saved_group_id}'], -1)
+        if instance.group_id is not None:
+            cache.change_feed_counts([f'group:{instance.group_id}'], 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    cache.bump_version('post', instance.pk)
+    cache.bump_version('feed', 'index')
+    cache.change_feed_counts(
+        post_feeds(instance.author_id, instance.group_id), -1)
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    counters.change_file_references(instance.image.name, -1)
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    instance.saved_image = Group.objects.filter(
+        pk=instance.pk).values_list('image', flat=True).first()
+    images.update_metadata(instance, instance.saved_image)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    cache.bump_version('group', instance.pk)
+    cache.bump_version('feed', 'index')
+    if (instance.image.name or '') != (instance.saved_image or ''):
+        image_replaced(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    cache.bump_version('group', instance.pk)
+    cache.bump_version('feed', 'index')
+    counters.change_file_references(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    cache.bump_version('comments', instance.post_id)
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    cache.bump_version('comments', instance.post_id)
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        cache.bump_versions(
+            'follows', [instance.user_id, instance.author_id])
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    cache.bump_versions('follows', [instance.user_id, instance.author_id])
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+def install_search(sender, using, **kwargs):
+    search.install(connections[using])
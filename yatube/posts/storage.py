@@ -0,0 +1,42 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Имя файла в хранилище: <каталог>/<2 знака хэша>/<sha256>.<расширение>
+CONTENT_NAME = re.compile(r'^[\w-]+/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 содержимого.
+
+    Одинаковые загрузки получают одно имя, поэтому второй раз файл
+    не пишется, а миниатюры sorl, привязанные к имени, не создаются
+    заново. Сколько объектов ссылается на файл, считает StoredFile.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension)
+        if self.exists(name):
+            # Свежая отметка не даёт collect_media удалить файл,
+            # пока новая ссылка на него ещё не сохранена.
+            os.utime(self.path(name))
+            return name.replace('\\', '/')
+        return super()._save(name, content)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def is_content_name(name):
+    return bool(name) and CONTENT_NAME.match(name) is not None
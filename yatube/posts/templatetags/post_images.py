@@ -0,0 +1,18 @@
+from django import template
+
+from ..images import CARD_SIZE, ready_picture
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post, sizes='(min-width: 992px) 960px, 100vw',
+                 loading='lazy'):
+    return {
+        'post': post,
+        'loading': loading,
+        'picture': ready_picture(post),
+        'sizes': sizes,
+        'width': CARD_SIZE[0],
+        'height': CARD_SIZE[1],
+    }
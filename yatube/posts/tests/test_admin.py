@@ -0,0 +1,86 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.admin import CommentAdmin, FollowAdmin, GroupAdmin, PostAdmin
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'Автор {i}')
+            post = Post.objects.create(
+                author=author, group=self.group, text=f'Тестовый пост {i}')
+            Comment.objects.create(
+                post=post, author=self.admin, text=f'Комментарий {i}')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse(f'admin:posts_{model_name}_changelist'))
+            self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_admins_registered(self):
+        for model, model_admin in ((Post, PostAdmin), (Group, GroupAdmin),
+                                   (Comment, CommentAdmin),
+                                   (Follow, FollowAdmin)):
+            with self.subTest(model=model):
+                self.assertIsInstance(
+                    admin.site._registry[model], model_admin)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Число запросов списка не зависит от числа строк."""
+        self.create_rows(2)
+        before = {
+            name: self.changelist_queries(name)
+            for name in ('post', 'comment', 'follow')}
+        self.create_rows(5)
+        for name, queries in before.items():
+            with self.subTest(model=name):
+                self.assertEqual(self.changelist_queries(name), queries)
+
+    def test_post_form_uses_autocomplete(self):
+        """Автор и группа выбираются поиском, без списка всех групп."""
+        self.create_rows(1)
+        Group.objects.create(
+            title='Другая группа', slug='other', description='Описание')
+        response = self.client.get(reverse(
+            'admin:posts_post_change', args=(Post.objects.first().pk,)))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'Другая группа')
+
+    @override_settings(ADMIN_COUNT_THRESHOLD=3)
+    def test_large_changelist_count_estimated(self):
+        """Длинный список не считается через COUNT(*)."""
+        self.create_rows(5)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'))
+        self.assertGreaterEqual(response.context['cl'].result_count, 3)
+        self.assertFalse(any(
+            'COUNT(*)' in query['sql'] and 'posts_post' in query['sql']
+            for query in context.captured_queries))
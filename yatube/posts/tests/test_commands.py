@@ -0,0 +1,340 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.cache import get_versions, version_key
+from posts.images import THUMBNAIL_VARIANTS, backend, ready_thumbnail
+from posts.models import (Comment, Follow, Group, Post, StoredFile,
+                          TimelineEntry, UserStats)
+from posts.storage import content_storage
+from posts.tests.fixtures import SMALL_GIF, TEMP_MEDIA_ROOT
+
+User = get_user_model()
+
+
+class RebuildTimelinesCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.follower = User.objects.create_user(username='Тестовый подписчик')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def test_rebuild_restores_timeline(self):
+        """Команда восстанавливает потерянные записи ленты."""
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.follower.pk, self.post.pk)])
+
+
+class RecountCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.reader = User.objects.create_user(username='Тестовый читатель')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+
+    def test_recount_fixes_drift(self):
+        """Команда возвращает разъехавшиеся счётчики к реальным значениям."""
+        UserStats.objects.update(
+            posts_count=10, followers_count=10, following_count=10)
+        UserStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comments_count=5)
+        call_command('recount', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            list(UserStats.objects.order_by('user').values_list(
+                'posts_count', 'followers_count', 'following_count')),
+            [(1, 1, 0), (0, 0, 1)])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RebuildThumbnailsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+            image=SimpleUploadedFile('group.gif', SMALL_GIF, 'image/gif'),
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('post.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint.json')
+
+    def rebuild(self, *args):
+        call_command(
+            'rebuild_thumbnails', '--workers=0',
+            f'--checkpoint={self.checkpoint}', *args, stdout=StringIO())
+
+    def group_thumbnail(self):
+        geometry, options = THUMBNAIL_VARIANTS['card']
+        return backend.get_ready_thumbnail(
+            self.group.image, geometry, **options)
+
+    def test_rebuild_creates_thumbnails(self):
+        """Команда создаёт миниатюры постов и групп."""
+        self.rebuild()
+        self.assertIsNotNone(ready_thumbnail(self.post))
+        self.assertIsNotNone(self.group_thumbnail())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_skips_processed_images(self):
+        """После прерывания уже обработанные картинки пропускаются."""
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'since': None, 'post': self.post.pk}, file)
+        self.rebuild('--resume')
+        geometry, options = THUMBNAIL_VARIANTS['card']
+        self.assertIsNone(backend.get_ready_thumbnail(
+            self.post.image, geometry, **options))
+        self.assertIsNotNone(self.group_thumbnail())
+
+    def test_since_filters_posts(self):
+        """Посты, опубликованные раньше --since, не обрабатываются."""
+        self.rebuild('--since=2999-01-01')
+        geometry, options = THUMBNAIL_VARIANTS['card']
+        self.assertIsNone(backend.get_ready_thumbnail(
+            self.post.image, geometry, **options))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageMetadataCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('backfill.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_backfill_fills_metadata(self):
+        """Команда заполняет метаданные картинок старых постов."""
+        Post.objects.update(
+            image_width=None, image_height=None, image_size=None,
+            image_hash='')
+        call_command('backfill_image_metadata', stdout=StringIO())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertEqual(len(post.image_hash), 64)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.author,
+            text='Тестовый пост',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_duplicates_share_file(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).references, 2)
+        second.delete()
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).references, 1)
+
+    def test_orphaned_file_collected(self):
+        """Файл без ссылок удаляется, файл с ссылками остаётся."""
+        post = self.create_post('orphan.gif')
+        name = post.image.name
+        post.delete()
+        call_command('collect_media', '--grace=0', stdout=StringIO())
+        self.assertFalse(content_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_referenced_file_kept(self):
+        post = self.create_post('kept.gif')
+        StoredFile.objects.filter(name=post.image.name).update(references=0)
+        call_command('collect_media', '--grace=0', stdout=StringIO())
+        self.assertTrue(content_storage.exists(post.image.name))
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).references, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportContentCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.directory, 'data.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def run_import(self, *args):
+        call_command(
+            'import_content', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_posts(self):
+        """Посты сохраняются с датами, счётчиками и лентами подписчиков."""
+        with open(os.path.join(self.directory, 'cat.gif'), 'wb') as file:
+            file.write(SMALL_GIF)
+        path = self.write_jsonl([
+            {'id': 1000, 'author': 'author', 'text': 'Первый',
+             'group': 'test-slug', 'pub_date': '2020-01-02T03:04:05+00:00',
+             'image': 'cat.gif'},
+            {'author': 'author', 'text': 'Второй'},
+            {'author': 'author', 'text': 'Без группы', 'group': 'missing'},
+        ])
+        self.run_import('posts', path, f'--images={self.directory}')
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'Первый', 'Второй'})
+        post = Post.objects.get(pk=1000)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).references, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_import_comments_and_follows_from_csv(self):
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comments = os.path.join(self.directory, 'comments.csv')
+        with open(comments, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['post', 'author', 'text'])
+            writer.writerow([post.pk, 'reader', 'Комментарий'])
+            writer.writerow([post.pk + 1, 'reader', 'К чужому посту'])
+        follows = os.path.join(self.directory, 'follows.csv')
+        with open(follows, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['user', 'author'])
+            writer.writerow(['newcomer', 'author'])
+        self.run_import('comments', comments)
+        self.run_import('follows', follows, '--create-users')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        newcomer = User.objects.get(username='newcomer')
+        self.assertTrue(
+            Follow.objects.filter(user=newcomer, author=self.author).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 2)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=newcomer, post=post).exists())
+
+    def test_import_invalidates_pages(self):
+        """Импорт без сигналов всё равно сбрасывает версии страниц."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comments = version_key('comments', post.pk)
+        follows = version_key('follows', self.author.pk)
+        versions = get_versions([comments, follows])
+        self.run_import('comments', self.write_jsonl(
+            [{'post': post.pk, 'author': 'reader', 'text': 'Комментарий'}]))
+        self.assertNotEqual(
+            get_versions([comments])[comments], versions[comments])
+        self.run_import('follows', self.write_jsonl(
+            [{'user': 'newcomer', 'author': 'author'}]), '--create-users')
+        self.assertNotEqual(
+            get_versions([follows])[follows], versions[follows])
+
+    def test_resume_skips_imported_rows(self):
+        path = self.write_jsonl([
+            {'author': 'author', 'text': 'Уже загружен'},
+            {'author': 'author', 'text': 'Ещё не загружен'},
+        ])
+        with open(path + '.checkpoint', 'w') as file:
+            json.dump({'row': 1, 'authors': [], 'groups': []}, file)
+        self.run_import('posts', path, '--resume')
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Ещё не загружен'])
+
+    def test_taken_ids_reported(self):
+        """Занятый id - ошибка строки, а не всего импорта."""
+        Post.objects.create(pk=500, author=self.author, text='Уже есть')
+        path = self.write_jsonl([
+            {'id': 500, 'author': 'author', 'text': 'Занятый id'},
+            {'id': 501, 'author': 'author', 'text': 'Свободный id'},
+            {'id': 501, 'author': 'author', 'text': 'Повтор в файле'},
+        ])
+        stderr = StringIO()
+        call_command(
+            'import_content', 'posts', path,
+            stdout=StringIO(), stderr=stderr)
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'Уже есть', 'Свободный id'})
+        self.assertIn('Строка 1', stderr.getvalue())
+        self.assertIn('Строка 3', stderr.getvalue())
+
+    def test_empty_file(self):
+        self.run_import('posts', self.write_jsonl([]))
+        self.assertFalse(Post.objects.exists())
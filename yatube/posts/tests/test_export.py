@@ -0,0 +1,110 @@
+import json
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import export
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.old_post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Старый пост')
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date=timezone.make_aware(datetime(2020, 1, 1, 12)))
+        cls.post = Post.objects.create(author=cls.author, text='Новый пост')
+        cls.other_post = Post.objects.create(
+            author=cls.other, group=cls.group, text='Чужой пост')
+        cls.comment = Comment.objects.create(
+            post=cls.old_post, author=cls.other, text='Комментарий')
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_content', *args, stdout=out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_command_exports_posts(self):
+        """Строки идут по id в формате import_content."""
+        rows = self.export('posts')
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [self.old_post.pk, self.post.pk, self.other_post.pk])
+        self.assertEqual(rows[0], {
+            'id': self.old_post.pk,
+            'author': 'author',
+            'group': 'test-slug',
+            'text': 'Старый пост',
+            'pub_date': '2020-01-01T12:00:00Z',
+            'image': None,
+        })
+
+    def test_command_filters(self):
+        def ids(*args):
+            return [row['id'] for row in self.export('posts', *args)]
+
+        self.assertEqual(
+            ids('--author=author'), [self.old_post.pk, self.post.pk])
+        self.assertEqual(
+            ids('--group=test-slug'), [self.old_post.pk, self.other_post.pk])
+        self.assertEqual(ids('--until=2020-01-01'), [self.old_post.pk])
+        self.assertEqual(
+            ids('--since=2021-01-01', '--author=author'), [self.post.pk])
+        self.assertEqual(
+            self.export('comments', '--group=test-slug')[0]['post'],
+            self.old_post.pk)
+        with self.assertRaises(CommandError):
+            self.export('posts', '--since=вчера')
+
+    def test_rows_are_read_in_keyset_batches(self):
+        """Каждая пачка - отдельный запрос по pk без OFFSET."""
+        with CaptureQueriesContext(connection) as context:
+            lines = list(export.ndjson('posts', batch_size=2))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len(context.captured_queries), 2)
+        for query in context.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+        self.assertIn(
+            '"posts_post"."id" >', context.captured_queries[1]['sql'])
+
+    def test_view_streams_ndjson_for_staff(self):
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(
+            reverse('posts:export', args=['comments']), {'author': 'other'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], export.CONTENT_TYPE)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines], [self.comment.pk])
+
+    def test_view_access_and_errors(self):
+        url = reverse('posts:export', args=['posts'])
+        client = Client()
+        client.force_login(self.author)
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(self.staff)
+        self.assertEqual(
+            client.get(url, {'since': 'вчера'}).status_code, 400)
+        self.assertEqual(
+            client.get(reverse('posts:export', args=['users'])).status_code,
+            404)
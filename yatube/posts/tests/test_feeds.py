@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.feeds import follow_feed_token
+from posts.models import Follow, Group, Post
+from posts.tests.test_views import LOCMEM_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        token = follow_feed_token(cls.reader)
+        cls.urls = (
+            reverse('posts:group_feed', args=[cls.group.slug]),
+            reverse('posts:group_atom_feed', args=[cls.group.slug]),
+            reverse('posts:author_feed', args=[cls.author.username]),
+            reverse('posts:author_atom_feed', args=[cls.author.username]),
+            reverse('posts:follow_feed', args=[token]),
+            reverse('posts:follow_atom_feed', args=[token]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_list_posts(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Тестовый пост')
+                self.assertContains(response, reverse(
+                    'posts:post_detail', args=[self.post.pk]))
+
+    def test_follow_feed_requires_token(self):
+        wrong_token = follow_feed_token(self.author)
+        response = self.client.get(
+            reverse('posts:follow_feed', args=[wrong_token]))
+        self.assertNotContains(response, 'Тестовый пост')
+        for token in ('garbage', f'{self.reader.pk}-0000',
+                      '99999999999999999999999-x'):
+            with self.subTest(token=token):
+                response = self.client.get(
+                    reverse('posts:follow_feed', args=[token]))
+                self.assertEqual(response.status_code, 404)
+
+    def test_polling_costs_no_queries(self):
+        """Повторный опрос ленты обходится кэшем, без запросов к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    cached = self.client.get(url)
+                    not_modified = self.client.get(
+                        url,
+                        HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(cached.content, response.content)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(context.captured_queries, [])
+
+    def test_feeds_are_revalidated_on_every_poll(self):
+        """Без max-age клиенты спрашивают сервер и видят изменения."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                cache_control = self.client.get(url)['Cache-Control']
+                self.assertIn('no-cache', cache_control)
+                self.assertNotIn('max-age', cache_control)
+                self.assertEqual(
+                    'private' in cache_control, '/follow/' in url)
+
+    def test_post_write_invalidates_feeds(self):
+        responses = {url: self.client.get(url) for url in self.urls}
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост')
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                    200)
+                self.assertContains(self.client.get(url), 'Новый пост')
+
+    def test_follow_page_links_personal_feed(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, self.urls[4])
@@ -2,12 +2,15 @@ import os
 
 import shutil
 import tempfile
+from io import BytesIO
 
+from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Post, Group, Comment
 
@@ -93,7 +96,8 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(last_post.author.id, self.post.author.id)
         self.assertEqual(last_post.group.pk, form_data['group'])
         self.assertEqual(last_post.text, form_data['text'])
-        self.assertEqual(last_post_image_name, form_data['image'].name)
+        self.assertEqual(
+            last_post_image_name, f'{last_post.image_hash}.gif')
 
     def test_post_edited(self):
         form_data = {
@@ -125,3 +129,73 @@ class PostCreateFormTests(TestCase):
         created_comment = Comment.objects.filter(
             post_id=self.post.pk).last()
         self.assertEqual(created_comment.text, form_data['text'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, UPLOAD_IMAGE_MAX_EDGE=40,
+                   UPLOAD_IMAGE_MAX_PIXELS=10000)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Тестовый юзер')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def jpeg(self, size):
+        image = Image.new('RGB', size, 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        content = BytesIO()
+        image.save(content, 'JPEG', exif=exif)
+        return content.getvalue()
+
+    def upload(self, size=None, content=None):
+        if content is None:
+            content = self.jpeg(size)
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с фотографией',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', content, 'image/jpeg'),
+            },
+        )
+
+    def test_upload_downscaled_and_stripped(self):
+        """Картинка уменьшается до предела и теряет EXIF."""
+        self.upload((80, 60))
+        post = Post.objects.latest('id')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (40, 30))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertFalse(image.getexif())
+        self.assertEqual((post.image_width, post.image_height), (40, 30))
+
+    def test_decompression_bomb_rejected(self):
+        """Слишком большая по числу пикселей картинка отклоняется."""
+        response = self.upload((200, 100))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Изображение слишком большое, загрузите картинку поменьше.')
+
+    def test_truncated_image_rejected(self):
+        """Оборванный файл с целым заголовком не роняет страницу."""
+        # Шум не сжимается, и обрыв приходится на данные, а не заголовок.
+        image = Image.frombytes('RGB', (80, 60), os.urandom(80 * 60 * 3))
+        content = BytesIO()
+        image.save(content, 'JPEG')
+        content = content.getvalue()
+        response = self.upload(content=content[:len(content) * 3 // 4])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image',
+            forms.ImageField.default_error_messages['invalid_image'])
@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
 
 User = get_user_model()
 
@@ -56,3 +56,60 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_post_count_follows_posts(self):
+        """Счётчик постов автора меняется при создании и удалении."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Post.objects.create(author=self.author, text='Второй пост')
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+
+    def test_author_change_moves_post(self):
+        """Пост со сменённым автором переезжает в его счётчик и ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        post.author = self.reader
+        post.save()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).posts_count, 1)
+        self.assertFalse(TimelineEntry.objects.exists())
+        post.author = self.author
+        post.save()
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user_id', 'author_id')),
+            [(self.reader.pk, self.author.pk)])
+
+    def test_comment_count_follows_comments(self):
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counts_follow_subscriptions(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 0)
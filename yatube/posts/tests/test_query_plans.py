@@ -0,0 +1,81 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class ListingQueryPlanTests(TestCase):
+    """Списки на страницах читаются по индексу, без сортировки в памяти."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Тестовый юзер')
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(3):
+            cls.post = Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=cls.author,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_listing_plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if 'ORDER BY' not in sql or 'django_session' in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans[sql] = ' / '.join(row[-1] for row in cursor.fetchall())
+        return plans
+
+    def test_listings_use_indexes(self):
+        pages = {
+            reverse('posts:index'): 'post_pub_date_idx',
+            reverse('posts:index') + '?page=2': 'post_pub_date_idx',
+            reverse('posts:index') + '?page=last': 'post_pub_date_idx',
+            reverse('posts:group_posts', kwargs={
+                'slug': self.group.slug}): 'post_group_pub_date_idx',
+            reverse('posts:profile', kwargs={
+                'username': self.author.username}): 'post_author_pub_date_idx',
+            reverse('posts:post_detail', kwargs={
+                'post_id': self.post.pk}): 'comment_post_created_idx',
+            reverse('posts:follow_index'): 'timeline_user_date_idx',
+        }
+        for url, index_name in pages.items():
+            with self.subTest(url=url):
+                plans = self.get_listing_plans(url)
+                self.assertTrue(plans, 'На странице нет списка')
+                for sql, plan in plans.items():
+                    self.assertNotIn('TEMP B-TREE', plan, sql)
+                self.assertTrue(
+                    any(index_name in plan for plan in plans.values()),
+                    plans)
@@ -0,0 +1,138 @@
+import shutil
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import queue
+from posts.checks import check_task_cache
+from posts.cache import version_key
+from posts.images import ready_thumbnail
+from posts.models import Post, Task
+from posts.tests.fixtures import SMALL_GIF, TEMP_MEDIA_ROOT
+
+User = get_user_model()
+
+calls = []
+
+
+@queue.task(key='record:{0}')
+def record(value):
+    calls.append(value)
+
+
+@queue.task(retries=1)
+def broken():
+    raise ValueError('Задача сломалась')
+
+
+@override_settings(
+    TASKS_EAGER=False, TASK_RETRY_DELAY=10, MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TaskQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        calls.clear()
+        cache.clear()
+
+    def run_worker(self):
+        call_command('runworker', '--workers=0', '--burst',
+                     stdout=StringIO(), stderr=StringIO())
+
+    def test_delay_deduplicates_pending_tasks(self):
+        self.assertTrue(record.delay(1))
+        self.assertFalse(record.delay(1))
+        self.assertTrue(record.delay(2))
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(calls, [])
+        self.run_worker()
+        self.assertEqual(calls, [1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_immediately(self):
+        self.assertTrue(record.delay(1))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_failure_queued_for_retry(self):
+        self.assertTrue(broken.delay())
+        task = Task.objects.get()
+        self.assertEqual((task.state, task.attempts), (Task.PENDING, 1))
+        self.assertIn('Задача сломалась', task.error)
+
+    def test_worker_without_shared_cache_warned(self):
+        locmem = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual(
+                [message.id for message in check_task_cache(None)],
+                ['posts.W001'])
+            with override_settings(TASKS_EAGER=True):
+                self.assertEqual(check_task_cache(None), [])
+
+    def test_thumbnails_wait_for_worker(self):
+        """Страница с новой картинкой не рисует миниатюры сама."""
+        post = Post.objects.create(
+            author=self.author,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('post.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.client.get(reverse('posts:index'))
+        self.assertIsNone(ready_thumbnail(post))
+        self.assertTrue(
+            Task.objects.filter(key=f'thumbnails:{post.pk}').exists())
+        self.run_worker()
+        self.assertIsNotNone(ready_thumbnail(post))
+
+    def test_broken_image_not_requeued(self):
+        """Без миниатюр задача падает, не сбрасывая кэш лент."""
+        post = Post.objects.create(
+            author=self.author, text='Тестовый пост', image='posts/no.gif')
+        version = cache.get(version_key('feed', 'index'))
+        with self.assertLogs('sorl.thumbnail', 'ERROR'):
+            self.run_worker()
+        task = Task.objects.get()
+        self.assertEqual((task.state, task.attempts), (Task.PENDING, 1))
+        self.assertIn('ThumbnailsNotCreated', task.error)
+        self.assertEqual(cache.get(version_key('feed', 'index')), version)
+        task.delete()
+        self.client.get(reverse('posts:index'))
+        self.assertIsNone(ready_thumbnail(post))
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_retried_with_backoff(self):
+        broken.delay()
+        self.run_worker()
+        task = Task.objects.get()
+        self.assertEqual((task.state, task.attempts), (Task.PENDING, 1))
+        self.assertIn('Задача сломалась', task.error)
+        self.assertGreater(
+            task.run_at, timezone.now() + timedelta(seconds=5))
+        Task.objects.update(run_at=timezone.now())
+        self.run_worker()
+        task.refresh_from_db()
+        self.assertEqual((task.state, task.attempts), (Task.FAILED, 2))
+
+    def test_abandoned_task_claimed_again(self):
+        record.delay(1)
+        claimed = queue.claim(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(queue.claim(10), [])
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        self.assertEqual(queue.claim(10), claimed)
@@ -0,0 +1,88 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.views import PAGE_NMB
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Поиск работает на FTS5 SQLite')
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.cat_post = Post.objects.create(
+            author=cls.author, text='Кошка спит на подоконнике')
+        cls.cats_post = Post.objects.create(
+            author=cls.author, text='Кошки, кошки и ещё раз кошки')
+        cls.dog_post = Post.objects.create(
+            author=cls.author, text='Собака гуляет во дворе')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        return self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params})
+
+    def test_search_page_uses_template(self):
+        response = self.guest_client.get(reverse('posts:search'))
+        self.assertTemplateUsed(response, 'posts/search.html')
+
+    def test_search_ranks_matches(self):
+        """Находятся посты со словом по префиксу, самые релевантные выше."""
+        response = self.search('КОШК')
+        self.assertEqual(
+            response.context['results'], [self.cats_post, self.cat_post])
+
+    def test_search_ignores_query_syntax(self):
+        """Операторы FTS5 во вводе не ломают поиск."""
+        response = self.search('собака" OR (NEAR')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['results'], [])
+
+    def test_search_follows_changes(self):
+        """Индекс обновляется и при изменении через QuerySet."""
+        Post.objects.filter(pk=self.dog_post.pk).update(
+            text='Кошка прогнала собаку')
+        Post.objects.filter(pk=self.cat_post.pk).delete()
+        response = self.search('кошк')
+        self.assertEqual(
+            set(response.context['results']), {self.cats_post, self.dog_post})
+
+    def test_search_keyset_pages(self):
+        """Следующая страница продолжает выдачу по курсору."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Кошка номер {i}')
+            for i in range(PAGE_NMB))
+        first = self.search('кошк')
+        self.assertEqual(len(first.context['results']), PAGE_NMB)
+        second = self.search('кошк', after=first.context['next_cursor'])
+        self.assertEqual(len(second.context['results']), 2)
+        self.assertIsNone(second.context['next_cursor'])
+        self.assertFalse(
+            set(first.context['results']) & set(second.context['results']))
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'собака'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog_post])
+        self.assertTrue(any(
+            'MATCH' in query['sql'] for query in context.captured_queries))
+        self.assertFalse(any(
+            'LIKE' in query['sql'] for query in context.captured_queries))
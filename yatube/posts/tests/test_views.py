@@ -1,16 +1,25 @@
+import hashlib
 import tempfile
 import shutil
+from io import StringIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.conf import settings
 from django import forms
 
+from posts.cache import get_versions, version_key
+from posts.images import (CARD_WIDTHS, generate_thumbnails,
+                          ready_thumbnail)
+from posts.paginators import KeysetPaginator
 from posts.views import PAGE_NMB
-from posts.models import Post, Group, Comment, Follow
+from posts.models import Post, Group, Comment, Follow, TimelineEntry
 
 User = get_user_model()
 
@@ -168,6 +177,92 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']),
                          Post.objects.count() - PAGE_NMB)
 
+    def test_cursor_pages_match_numbered_pages(self):
+        """Переход по ?after= и ?before= совпадает со страницами ?page=."""
+        first_page = self.authorized_client.get(
+            reverse('posts:index')).context['page_obj']
+        response = self.authorized_client.get(
+            reverse('posts:index') + f'?after={first_page.next_cursor}')
+        second_page = response.context['page_obj']
+        numbered_page = self.authorized_client.get(
+            reverse('posts:index') + '?page=2').context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertEqual(list(second_page), list(numbered_page))
+        self.assertFalse(second_page.has_next())
+        response = self.authorized_client.get(
+            reverse('posts:index') + f'?before={second_page.previous_cursor}')
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_last_page_read_without_offset(self):
+        """Ссылка «Последняя» читает конец ленты по ключу, без OFFSET."""
+        url = reverse('posts:index')
+        self.assertContains(self.authorized_client.get(url), '?page=last')
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url + '?page=last')
+        self.assertFalse(any(
+            'OFFSET' in query['sql'] for query in context.captured_queries))
+        last_page = response.context['page_obj']
+        numbered_page = self.authorized_client.get(
+            url + '?page=2').context['page_obj']
+        self.assertEqual(last_page.number, 2)
+        self.assertEqual(list(last_page), list(numbered_page))
+        self.assertFalse(last_page.has_next())
+        response = self.authorized_client.get(
+            url + f'?before={last_page.previous_cursor}')
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_cached_count_follows_writes(self):
+        """Закэшированное число постов ленты меняется вместе с лентой."""
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        count = Post.objects.filter(group=self.group).count()
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, count)
+        post = Post.objects.create(
+            text='Новый пост', author=self.user, group=self.group)
+        response = self.authorized_client.get(url)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, count + 1)
+        post.group = Group.objects.create(title='Другая', slug='other')
+        post.save()
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, count)
+
+    @override_settings(FEED_COUNT_THRESHOLD=5)
+    def test_estimated_count_keeps_navigation(self):
+        """По оценённой ленте можно пройти до самого конца."""
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        page = self.authorized_client.get(url).context['page_obj']
+        seen = list(page)
+        while page.next_cursor:
+            page = self.authorized_client.get(
+                url + f'?after={page.next_cursor}').context['page_obj']
+            seen.extend(page)
+        self.assertEqual(
+            seen, list(Post.objects.filter(group=self.group).order_by(
+                '-pub_date', '-id')))
+
+    def test_page_window_is_elided(self):
+        """Ссылки ведут только на соседние и крайние страницы."""
+        paginator = KeysetPaginator(Post.objects.all(), 1)
+        ellipsis = paginator.ELLIPSIS
+        cases = {
+            1: [1, 2, 3, 4, ellipsis, 12, 13],
+            13: [1, 2, ellipsis, 10, 11, 12, 13],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    paginator.get_page(number).page_window, expected)
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:group_posts',
+                    kwargs={'slug': 'test-slug'}) + '?after=broken')
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), PAGE_NMB)
+
 
 class CommentTest(TestCase):
     """Проверка комментариев"""
@@ -203,7 +298,7 @@ class CommentTest(TestCase):
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, TASKS_EAGER=False)
 class ImageViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -257,7 +352,82 @@ class ImageViewsTest(TestCase):
         for reverse_name in self.pages.keys():
             response = self.authorized_client.get(reverse_name)
             image_file = response.context['page_obj'][0].image
-            self.assertEqual(image_file, 'posts/small.gif')
+            self.assertEqual(image_file, self.post.image.name)
+
+    def test_image_metadata_filled_on_upload(self):
+        """При загрузке картинки сохраняются её размеры, вес и хэш."""
+        self.post.refresh_from_db()
+        content = self.post.image.open('rb').read()
+        self.post.image.close()
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (2, 1))
+        self.assertEqual(self.post.image_size, len(content))
+        self.assertEqual(
+            self.post.image_hash, hashlib.sha256(content).hexdigest())
+
+    def test_lazy_picture_with_inline_placeholder(self):
+        """Карточка грузит картинку лениво, показывая заглушку на месте."""
+        self.post.refresh_from_db()
+        self.assertRegex(self.post.image_color, r'^#[0-9a-f]{6}$')
+        self.assertTrue(self.post.image_placeholder.startswith('data:image/'))
+        generate_thumbnails(self.post.pk)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, self.post.image_placeholder)
+        self.assertContains(response, self.post.image_color)
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, вместо неё выводится заглушка."""
+        for reverse_name in self.pages.keys():
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name)
+                self.assertContains(response, 'aspect-ratio: 960 / 339')
+        generate_thumbnails(self.post.pk)
+        for reverse_name in self.pages.keys():
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name)
+                self.assertNotContains(response, 'aspect-ratio: 960 / 339')
+                self.assertContains(
+                    response, ready_thumbnail(self.post).url)
+
+    def test_picture_offers_modern_formats(self):
+        """Карточка предлагает WebP и несколько ширин картинки."""
+        generate_thumbnails(self.post.pk)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, '<source type="image/webp"')
+        for width in CARD_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f'.webp {width}w')
+                self.assertContains(response, f'.jpg {width}w')
+
+    def test_thumbnails_read_in_one_batch(self):
+        """Миниатюры всех карточек страницы читаются одним запросом."""
+        for i in range(3):
+            Post.objects.create(
+                author=self.user,
+                text=f'Ещё пост {i}',
+                image=self.post.image.name,
+            )
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.guest_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in context.captured_queries
+            if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_thumbnail_generated_on_save(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='other.gif',
+                content=self.post.image.open('rb').read(),
+                content_type='image/gif'),
+        )
+        self.assertIsNotNone(ready_thumbnail(post))
 
 
 class CacheTests(TestCase):
@@ -279,15 +449,41 @@ class CacheTests(TestCase):
         """Проверка кэшинга index."""
         response = self.authorized_client.get(reverse('posts:index'))
         new_content = response.content
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
-        content_after_delete = response.content
-        self.assertEqual(new_content, content_after_delete)
+        content_after_update = response.content
+        self.assertEqual(new_content, content_after_update)
         cache.clear()
-        response = self.client.get(reverse('posts:index'))
+        response = self.authorized_client.get(reverse('posts:index'))
         content_after_clear = response.content
         self.assertNotEqual(content_after_clear, new_content)
 
+    def test_index_invalidated_on_write(self):
+        """Изменения постов сразу видны на закэшированной главной."""
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+        self.post.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Тестовый текст')
+
+    @override_settings(CACHE_VERSION_TIMEOUT=0)
+    def test_versions_expire_without_shared_cache(self):
+        """Без общего кэша версии живут недолго и не расходятся часами."""
+        key = version_key('feed', 'index')
+        cache.delete(key)
+        version = get_versions([key])[key]
+        self.assertNotEqual(get_versions([key])[key], version)
+
+    def test_cached_index_is_per_user_and_revalidated(self):
+        """Кэш главной не отдаёт чужую шапку и не задаёт max-age."""
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn('max-age', response.get('Cache-Control', ''))
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'Выйти')
+        self.assertContains(response, 'Войти')
+
 
 class FollowerTest(TestCase):
     @classmethod
@@ -335,3 +531,263 @@ class FollowerTest(TestCase):
         self.assertEqual(post_text, 'Тестовый текст')
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotContains(response, 'Тестовый текст')
+
+    def test_new_post_appears_in_feed(self):
+        """Новый пост автора попадает в ленту уже подписанного."""
+        Follow.objects.create(
+            user=self.follow_user, author=self.author_user)
+        Post.objects.create(author=self.author_user, text='Новый пост')
+        response = self.follow_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0].text, 'Новый пост')
+
+    def test_unfollow_clears_feed(self):
+        """После отписки посты автора пропадают из ленты."""
+        self.follow_client.get(
+            reverse('posts:profile_follow', kwargs={
+                'username': self.author_user.username}))
+        self.follow_client.get(
+            reverse('posts:profile_unfollow', kwargs={
+                'username': self.author_user.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follow_user).exists())
+        response = self.follow_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, 'Тестовый текст')
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_feed_length_is_capped(self):
+        Follow.objects.create(
+            user=self.follow_user, author=self.author_user)
+        for i in range(3):
+            Post.objects.create(author=self.author_user, text=f'Пост {i}')
+        entries = TimelineEntry.objects.filter(user=self.follow_user)
+        self.assertEqual(
+            [entry.post.text for entry in entries], ['Пост 2', 'Пост 1'])
+
+    @override_settings(TIMELINE_LENGTH=1, TASKS_EAGER=False)
+    def test_fan_out_trims_in_background(self):
+        """Публикация не обходит ленты подписчиков по одной."""
+        readers = [User.objects.create_user(username=f'Читатель {i}')
+                   for i in range(3)]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author_user)
+        with CaptureQueriesContext(connection) as context:
+            Post.objects.create(author=self.author_user, text='Новый пост')
+        self.assertFalse(any(
+            'OFFSET' in query['sql'] for query in context.captured_queries))
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=readers[0]).count(), 2)
+        call_command('runworker', '--workers=0', '--burst',
+                     stdout=StringIO(), stderr=StringIO())
+        for reader in readers:
+            self.assertEqual(
+                [entry.post.text for entry in TimelineEntry.objects.filter(
+                    user=reader)], ['Новый пост'])
+
+
+LOCMEM_CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': alias,
+    }
+    for alias in settings.CACHES
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTests(TestCase):
+    """Число запросов на странице не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Тестовый юзер')
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(PAGE_NMB):
+            cls.post = Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=cls.author,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'Комментатор {i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_views_query_budget(self):
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_posts', kwargs={
+                'slug': self.group.slug}): 5,
+            reverse('posts:profile', kwargs={
+                'username': self.author.username}): 6,
+            reverse('posts:post_detail', kwargs={
+                'post_id': self.post.pk}): 3,
+            reverse('posts:follow_index'): 3,
+            reverse('posts:post_create'): 1,
+            reverse('posts:post_edit', kwargs={
+                'post_id': self.post.pk}): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.authorized_client.get(url)
+
+    def test_feed_count_is_cached(self):
+        """Повторный запрос ленты обходится без COUNT(*)."""
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        self.authorized_client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        self.assertFalse(
+            [query for query in context.captured_queries
+             if 'COUNT(' in query['sql']])
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Тестовый юзер')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.user,
+            group=cls.group,
+        )
+        cls.url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_is_cached(self):
+        """Карточка берётся из кэша, пока пост не сохраняли."""
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertContains(self.client.get(self.url), 'Тестовый пост')
+
+    def test_card_is_invalidated(self):
+        """Карточка перерисовывается после правки поста, автора и группы."""
+        self.client.get(self.url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Имя'
+        author.last_name = 'Фамилия'
+        author.save()
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Новый текст')
+        self.assertContains(response, 'Имя Фамилия')
+        self.assertContains(response, 'Новое название', count=2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    """Неизменившиеся страницы отдаются как 304 без отрисовки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Тестовый автор')
+        cls.reader = User.objects.create_user(username='Тестовый читатель')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={
+                'username': cls.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response['ETag'].startswith('W/'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as context:
+                    again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 304)
+                self.assertFalse(any(
+                    'posts_comment' in query['sql']
+                    for query in context.captured_queries))
+                since = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(since.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        responses = {url: self.client.get(url) for url in self.urls}
+        Post.objects.get(pk=self.post.pk).save()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, response).status_code,
+                                 200)
+
+    def test_comment_and_follow_invalidate_pages(self):
+        detail, profile = self.urls[3], self.urls[2]
+        responses = {url: self.client.get(url) for url in (detail, profile)}
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.assertEqual(
+            self.revalidate(detail, responses[detail]).status_code, 200)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.revalidate(profile, responses[profile]).status_code, 200)
+        response = self.client.get(detail)
+        comment.delete()
+        self.assertEqual(self.revalidate(detail, response).status_code, 200)
+
+    def test_detail_shows_comments_count(self):
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.client.get(self.urls[3])
+        self.assertRegex(
+            response.content.decode(), r'Комментариев:\s+<span> 1 </span>')
+
+    def test_commenter_rename_invalidates_post(self):
+        detail = self.urls[3]
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.client.get(detail)
+        self.reader.first_name = 'Новое имя'
+        self.reader.save()
+        self.assertEqual(self.revalidate(detail, response).status_code, 200)
+
+    def test_validators_differ_between_users(self):
+        url = self.urls[0]
+        response = self.client.get(url)
+        self.assertEqual(Client().get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
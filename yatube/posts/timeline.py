@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db import connection
+
+from . import cache
+from .models import Follow, Post, TimelineEntry
+from .queue import task
+
+BATCH_SIZE = 500
+
+
+def timeline_length():
+    return settings.TIMELINE_LENGTH
+
+
+def make_entry(user_id, post):
+    return TimelineEntry(user_id=user_id, post_id=post.pk,
+                         author_id=post.author_id, pub_date=post.pub_date)
+
+
+def trim(user_id):
+    """Удаляет из ленты записи сверх TIMELINE_LENGTH."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    last_kept = entries.values_list('pub_date', 'id')[
+        timeline_length() - 1:timeline_length()]
+    if not last_kept:
+        return
+    pub_date, pk = last_kept[0]
+    entries.filter(pub_date__lte=pub_date).exclude(
+        pub_date=pub_date, id__gte=pk).delete()
+
+
+# Записи лент подписчиков автора сверх TIMELINE_LENGTH: номер записи
+# в своей ленте считает оконная функция, всё удаляется одним запросом.
+TRIM_FOLLOWERS_SQL = f"""
+    DELETE FROM {TimelineEntry._meta.db_table} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY pub_date DESC, id DESC
+            ) AS position
+            FROM {TimelineEntry._meta.db_table}
+            WHERE user_id IN (
+                SELECT user_id FROM {Follow._meta.db_table}
+                WHERE author_id = %s)
+        ) AS ranked
+        WHERE position > %s)"""
+
+
+@task(key='trim_followers:{0}')
+def trim_followers(author_id):
+    """Обрезает ленты всех подписчиков автора до TIMELINE_LENGTH."""
+    with connection.cursor() as cursor:
+        cursor.execute(TRIM_FOLLOWERS_SQL, [author_id, timeline_length()])
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора.
+
+    В запросе публикации остаётся только вставка; ленты обрезает
+    фоновая задача, пока ждёт - одна на автора.
+    """
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        (make_entry(user_id, post) for user_id in followers),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    cache.bump_versions('timeline', followers)
+    if followers:
+        trim_followers.delay(post.author_id)
+
+
+def reassign(post):
+    """Перекладывает пост из лент подписчиков старого автора в ленты нового."""
+    entries = TimelineEntry.objects.filter(post_id=post.pk)
+    users = list(entries.values_list('user_id', flat=True))
+    entries.delete()
+    cache.bump_versions('timeline', users)
+    fan_out(post)
+
+
+def backfill(user_id, author_id):
+    """Переносит в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').only('pk', 'author_id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (make_entry(user_id, post) for post in posts[:timeline_length()]),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim(user_id)
+    cache.bump_version('timeline', user_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    cache.bump_version('timeline', user_id)
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(author__following__user_id=user_id).order_by(
+        '-pub_date', '-id').only('pk', 'author_id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (make_entry(user_id, post) for post in posts[:timeline_length()]),
+        batch_size=BATCH_SIZE)
+    cache.bump_version('timeline', user_id)
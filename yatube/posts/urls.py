@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
@@ -11,8 +11,20 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
+    path('group/<slug:slug>/rss/', feeds.group_feed, name='group_feed'),
+    path('group/<slug:slug>/atom/',
+         feeds.group_atom_feed, name='group_atom_feed'),
+    path('profile/<str:username>/rss/',
+         feeds.author_feed, name='author_feed'),
+    path('profile/<str:username>/atom/',
+         feeds.author_atom_feed, name='author_atom_feed'),
+    path('follow/<str:token>/rss/', feeds.follow_feed, name='follow_feed'),
+    path('follow/<str:token>/atom/',
+         feeds.follow_atom_feed, name='follow_atom_feed'),
     path('', views.index, name='index'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
+    path('export/<str:kind>/', views.export_content, name='export'),
     path('profile/<str:username>/follow/',
          views.profile_follow, name='profile_follow'),
     path('profile/<str:username>/unfollow/',
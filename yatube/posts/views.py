@@ -1,21 +1,76 @@
-from django.core.paginator import Paginator
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
 
-from .models import User, Post, Group, Follow, get_user_model
+from .models import User, Post, Group, Follow, TimelineEntry
+from . import export, images, search
+from .feeds import follow_feed_token
+from .cache import cache_feed, conditional, page_validators, version_key
+from .counters import get_stats
 from .forms import PostForm, CommentForm
+from .paginators import CachedCountPaginator
 
 PAGE_NMB = 10
 
 
-@cache_page(20, key_prefix='index_page')
+def paginate(request, posts, feed=None):
+    paginator = CachedCountPaginator(posts, PAGE_NMB, feed=feed)
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def feed_validators(request, *args, **kwargs):
+    """Ленты зависят от всех постов, групп и авторов сразу.
+
+    Любое их изменение, включая удаление группы или автора, меняет
+    версию ленты index, поэтому запрос к базе не нужен.
+    """
+    return page_validators(request, [version_key('feed', 'index')])
+
+
+def page_author(request, username):
+    """Автор профиля; валидаторы и сама страница читают его один раз."""
+    if not hasattr(request, 'page_author'):
+        request.page_author = get_object_or_404(
+            User.objects.select_related('stats'), username=username)
+    return request.page_author
+
+
+def page_post(request, post_id):
+    """Пост страницы; валидаторы и сама страница читают его один раз."""
+    if not hasattr(request, 'page_post'):
+        request.page_post = get_object_or_404(
+            Post.objects.select_related('author__stats', 'group'),
+            id=post_id)
+    return request.page_post
+
+
+def profile_validators(request, username):
+    author = page_author(request, username)
+    # Подписки меняют счётчики профиля и кнопку «Подписаться».
+    return page_validators(request, [
+        version_key('feed', 'index'), version_key('follows', author.pk)])
+
+
+def post_detail_validators(request, post_id):
+    post = page_post(request, post_id)
+    return page_validators(request, [
+        version_key('post', post.pk),
+        version_key('user', post.author_id),
+        version_key('group', post.group_id),
+        version_key('comments', post.pk),
+    ], parts=[get_stats(post.author).posts_count])
+
+
+@conditional(feed_validators)
+@cache_feed('index')
 def index(request):
-    post_list = Post.objects.all().select_related(
-        'group').order_by('-pub_date')
-    paginator = Paginator(post_list, PAGE_NMB)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list, feed='index')
     index = True
     context = {
         'post_list': post_list,
@@ -25,12 +80,11 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional(feed_validators)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().order_by('-pub_date')
-    paginator = Paginator(posts, PAGE_NMB)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author')
+    page_obj = paginate(request, posts, feed=f'group:{group.pk}')
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -39,14 +93,12 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_validators)
 def profile(request, username):
-    author = get_user_model()
-    user = get_object_or_404(author, username=username)
-    posts = user.posts.all()
-    posts_count = posts.count()
-    paginator = Paginator(posts, PAGE_NMB)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user = page_author(request, username)
+    posts = user.posts.select_related('group')
+    page_obj = paginate(request, posts, feed=f'author:{user.pk}')
+    stats = get_stats(user)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=user).exists()
@@ -56,18 +108,20 @@ def profile(request, username):
         'author': user,
         'posts': posts,
         'page_obj': page_obj,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_detail_validators)
 def post_detail(request, post_id):
-    queryset = Post.objects.select_related('author', 'group')
-    post = get_object_or_404(queryset, id=post_id)
-    author_posts = post.author.posts.count()
+    post = page_post(request, post_id)
+    images.prefetch_thumbnails([post])
+    author_posts = get_stats(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'author_posts': author_posts,
@@ -78,6 +132,35 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    posts = Post.objects.select_related('author', 'group')
+    results, next_cursor = search.search(
+        posts, query, PAGE_NMB, after=request.GET.get('after'))
+    context = {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@staff_member_required
+def export_content(request, kind):
+    if kind not in export.KINDS:
+        raise Http404
+    filters = {key: request.GET.get(key)
+               for key in ('author', 'group', 'since', 'until')}
+    try:
+        lines = export.ndjson(kind, **filters)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(lines, content_type=export.CONTENT_TYPE)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.ndjson"')
+    return response
+
+
 @login_required
 def post_create(request):
     if request.method == 'POST':
@@ -133,15 +216,16 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, PAGE_NMB)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    entries = TimelineEntry.objects.filter(
+        user=request.user).select_related('post__author', 'post__group')
+    page_obj = paginate(request, entries)
+    page_obj.object_list = [entry.post for entry in page_obj]
     follow = True
     context = {
         'page_obj': page_obj,
-        'paginator': paginator,
+        'paginator': page_obj.paginator,
         'follow': follow,
+        'feed_token': follow_feed_token(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
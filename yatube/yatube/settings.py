@@ -132,8 +132,98 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Бэкенд кэша выбирается переменной окружения YATUBE_CACHE_BACKEND:
+# locmem - своя память у каждого процесса (по умолчанию),
+# file - общий для всех процессов хоста каталог YATUBE_CACHE_DIR,
+# db - таблицы в базе данных, создаются командой createcachetable.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+CACHE_BACKEND = os.getenv('YATUBE_CACHE_BACKEND', 'locmem')
+CACHE_DIR = os.getenv('YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+
+# Для каждого кэша: сколько записей хранить и какую часть (1/N) удалять
+# при переполнении. Переопределяются переменными окружения
+# YATUBE_CACHE_<ИМЯ>_MAX_ENTRIES и YATUBE_CACHE_<ИМЯ>_CULL_FREQUENCY.
+CACHE_LIMITS = {
+    'default': (10000, 3),
+    'pages': (2000, 3),
+    'fragments': (20000, 4),
+    'sessions': (10000, 3),
+}
+
+
+def cache_location(alias):
+    if CACHE_BACKEND == 'file':
+        return os.path.join(CACHE_DIR, alias)
+    if CACHE_BACKEND == 'db':
+        return f'yatube_cache_{alias}'
+    return alias
+
+
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    alias: {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': cache_location(alias),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv(
+                f'YATUBE_CACHE_{alias.upper()}_MAX_ENTRIES', max_entries)),
+            'CULL_FREQUENCY': int(os.getenv(
+                f'YATUBE_CACHE_{alias.upper()}_CULL_FREQUENCY', cull)),
+        },
     }
+    for alias, (max_entries, cull) in CACHE_LIMITS.items()
 }
+
+# Кэш locmem у каждого процесса свой: запись в одном процессе не меняет
+# версий в другом. Поэтому с ним версии, карточки и страницы живут
+# по 20 секунд, а долго хранятся только в общем кэше file или db
+SHARED_CACHE = CACHE_BACKEND != 'locmem'
+SHORT_CACHE_TIMEOUT = 20
+
+# Сколько секунд хранится версия объекта, от которой зависят кэши
+CACHE_VERSION_TIMEOUT = None if SHARED_CACHE else SHORT_CACHE_TIMEOUT
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Сколько последних постов хранится в ленте подписок пользователя
+TIMELINE_LENGTH = 1000
+
+# Сколько секунд хранится отрисованная карточка поста
+POST_CARD_TIMEOUT = 60 * 60 * 24 if SHARED_CACHE else SHORT_CACHE_TIMEOUT
+
+# Сколько секунд хранится страница ленты, если в неё ничего не писали
+FEED_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else SHORT_CACHE_TIMEOUT
+
+# Сколько секунд хранится число постов ленты для пагинатора
+FEED_COUNT_TIMEOUT = 60 * 60
+# Ленты длиннее этого порога не считаются точно, их длина оценивается
+FEED_COUNT_THRESHOLD = 10000
+# То же для списков в админке
+ADMIN_COUNT_THRESHOLD = 10000
+
+# Фоновые задачи (миниатюры, ленты подписчиков) выполняет runworker
+# в TASK_WORKERS потоках. Упавшая задача повторяется TASK_RETRIES раз
+# с паузой TASK_RETRY_DELAY секунд, которая удваивается с каждой
+# попыткой; задача, занятая дольше TASK_TIMEOUT секунд, считается
+# брошенной. При TASKS_EAGER задачи выполняются сразу при постановке,
+# и запросы сами платят за миниатюры. Воркер сообщает страницам о своей
+# работе через кэш, поэтому с кэшем locmem, своим у каждого процесса,
+# так и работает по умолчанию; YATUBE_TASKS_EAGER=0 или 1 задаёт явно
+TASK_WORKERS = 4
+TASK_RETRIES = 3
+TASK_RETRY_DELAY = 10
+TASK_TIMEOUT = 10 * 60
+TASKS_EAGER = os.getenv(
+    'YATUBE_TASKS_EAGER', '0' if SHARED_CACHE else '1') == '1'
+# Загруженные картинки уменьшаются до UPLOAD_IMAGE_MAX_EDGE по длинной
+# стороне и пересохраняются с качеством UPLOAD_IMAGE_QUALITY; картинки
+# больше UPLOAD_IMAGE_MAX_PIXELS отклоняются, не декодируясь
+UPLOAD_IMAGE_MAX_EDGE = int(os.getenv('YATUBE_UPLOAD_IMAGE_MAX_EDGE', 2048))
+UPLOAD_IMAGE_QUALITY = int(os.getenv('YATUBE_UPLOAD_IMAGE_QUALITY', 85))
+UPLOAD_IMAGE_MAX_PIXELS = 50_000_000
+# Хранилище sorl, которое умеет находить миниатюры страницы одной пачкой
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'